@@ -1,33 +1,54 @@
-import os
+import argparse
 import pygame
 import sys
-import json
-import math
-
-from res.character import load_character_by_name, Character, evaluate_expression
-from res.enemies import enemy_take_turn
+import time
 
 from utils.draw import (
-    draw_grid,
-    draw_battle_log,
-    draw_ui_buttons,
-    render_skill_buttons,
+    draw_profiler_hud,
+    profiler_hud_rect,
+    BattleLogView,
+    battle_log_rect,
+    build_background,
+    button_rect,
+    draw_button,
     draw_game_over_screen,
     draw_victory_screen,
-    draw_units,
-    highlight_movement_tiles,
+    draw_tile_highlight,
     draw_choose_player_character,
+    tile_rect,
+    ui_button_layout,
+    unit_blits,
+    unit_rect,
     run_main_menu,
     run_campaign_select
 )
-from utils.game_engine import (
-    move_character,
-    get_character_at,
-    roll_initiative,
-    handle_ko,
-    advance_turn,
-    resolve_attack
-)
+from res.planner import PLANNERS, make_planner
+from utils.ai_turns import AiTurnRunner
+from utils.assets import FLOOR_TILE, AssetManager, unit_asset_names
+from utils.battle import BattleSession, load_starter_characters
+from utils.battle_log import BattleLog, history_path_for
+from utils.profiler import FrameProfiler
+from utils.render import LayeredRenderer
+from utils.replay import Replay, ReplayError, replay_path_for
+from utils.save import QUICKSAVE_NAME, Autosaver, SaveError, SaveWriter, latest_save, load_game, save_game, save_path_for
+from utils.scheduler import FrameScheduler
+from utils.text import get_font, render_text
+from utils.trace import DEBUG, tracer
+
+parser = argparse.ArgumentParser(description="Aeloria tactical RPG")
+parser.add_argument("--ai", choices=sorted(PLANNERS), default="greedy", help="Enemy planner tier")
+parser.add_argument("--ai-budget", type=int, default=150, help="Milliseconds per enemy turn for the mcts planner")
+parser.add_argument("--ai-workers", type=int, default=0, help="Rollout processes for the mcts planner")
+parser.add_argument("--replay", help="Play back a recorded battle instead of starting a new one")
+parser.add_argument("--replay-speed", type=float, default=1.0, help="Playback speed multiplier for --replay")
+parser.add_argument("--profile-hud", action="store_true", help="Start with the frame profiler overlay shown (toggle with F3)")
+parser.add_argument("--profile-trace", help="Write sampled frame timings to this Chrome trace JSON file on exit")
+parser.add_argument("--profile-sample", type=int, default=10, help="Keep every Nth frame for --profile-trace")
+args = parser.parse_args()
+
+# Made before pygame or any of our threads start, since the mcts planner
+# forks its rollout workers here.
+planner = None if args.replay else make_planner(args.ai, args.ai_budget, args.ai_workers)
 
 pygame.init()
 
@@ -43,7 +64,9 @@ GRID_WIDTH = 16
 GRID_HEIGHT = 16
 SCREEN_WIDTH = TILE_SIZE * GRID_WIDTH
 SCREEN_HEIGHT = TILE_SIZE * GRID_HEIGHT
-MOVE_RANGE = 3
+REPLAY_STEP_MS = 400
+HUD_REFRESH_FRAMES = 15
+THINKING_DOT_MS = 300
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -55,27 +78,24 @@ GREEN = (0, 255, 0)
 
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Tactical RPG")
-clock = pygame.time.Clock()
-font = pygame.font.SysFont(None, int(24 * SCALE))
-log_font = pygame.font.SysFont(None, int(16 * SCALE))
-selected_campaign = None
-
-mode = "idle"
-selected_attack = None
-battle_log = []
-
-def add_to_log(text):
-    battle_log.append(text)
-    if len(battle_log) > 5:
-        battle_log.pop(0)
-
-def load_starter_characters(campaign_name):
-    path = os.path.join("campaigns", campaign_name, "characters.json")
-    with open(path) as f:
-        characters = json.load(f)
-    return [c for c in characters if c.get("is_starter")]
-
-def generate_skill_buttons(attacker, skills_data):
+scheduler = FrameScheduler()
+profiler = FrameProfiler(sample_every=max(1, args.profile_sample) if args.profile_trace else 0)
+font = get_font(None, int(24 * SCALE))
+log_font = get_font(None, int(16 * SCALE))
+log_view = BattleLogView(log_font, battle_log_rect(SCREEN_WIDTH, SCREEN_HEIGHT))
+save_writer = SaveWriter()
+ai_turns = AiTurnRunner()
+autosaver = Autosaver(save_writer)
+assets = AssetManager()
+SPRITE_SIZE = (TILE_SIZE, TILE_SIZE)
+
+def preload_battle_assets(campaign):
+    # The sprite atlas is opened (or packed) and scaled on the asset threads
+    # while the menus are up.
+    assets.set_campaign(campaign)
+    assets.load_atlas(SPRITE_SIZE)
+
+def generate_skill_buttons(attacker, skills_data, mode):
     skill_buttons = {}
     base_x = 10
     base_y = SCREEN_HEIGHT - 120
@@ -93,14 +113,6 @@ def generate_skill_buttons(attacker, skills_data):
 
     if mode == "attack":
         all_skills = ["weapon_attack"] + filtered_skills
-        weapon = attacker.equipment.weapon
-        skills_data["weapon_attack"] = {
-            "name": "Weapon Attack",
-            "category": "attack",
-            "target": "enemy",
-            "range": getattr(weapon, "range", 1) if weapon else 1,
-            "damage": getattr(weapon, "atk_roll", "0"),
-        }
     else:
         all_skills = filtered_skills
 
@@ -111,111 +123,202 @@ def generate_skill_buttons(attacker, skills_data):
             button_width,
             button_height
         )
-        skills_data[skill_id]["__rect"] = rect
-        skills_data[skill_id]["__id"] = skill_id
         skill_buttons[skill_id] = rect
 
-    print(f"[SKILL BUTTONS] Loaded: {list(skill_buttons.keys())}")
+    if tracer.enabled("ui", DEBUG):
+        tracer.note("ui", "SKILL BUTTONS", f"Loaded: {list(skill_buttons.keys())}", DEBUG)
     return skill_buttons
 
-def initialize_characters(campaign_name):
-    starter_characters = load_starter_characters(campaign_name)
-    party = []
-
-    for idx, data in enumerate(starter_characters):
-        ch = load_character_by_name(data["name"], campaign_name)
-        ch.team = "player"
-        ch.x = 2 + idx
-        ch.y = 2
-        ch.has_moved = False
-        party.append(ch)
+def update_unit_layer(layer, session):
+    # Units are plain blit lists, so a redraw is one Surface.blits() batch.
+    items = {}
+    previous = layer.items
+    for c in session.all_units:
+        selected = c is session.active
+        # None until the atlas is ready. The asset threads post ASSETS_READY
+        # when it is, which wakes an idle frame loop to redraw the unit.
+        sprite = assets.sprite(unit_asset_names(c), SPRITE_SIZE)
+        state = (c.x, c.y, c.current_hp, c.hp, c.team, c.name, selected, sprite)
+        item = previous.get(id(c))
+        if item is None or item[0] != state:
+            item = (state, unit_rect(font, c, TILE_SIZE), unit_blits(font, c, selected, TILE_SIZE, sprite))
+        items[id(c)] = item
+    layer.update(items)
+
+def update_overlay_layer(layer, session):
+    items = {}
+    active = session.active
+    if session.awaiting_input() and session.mode == "move" and not active.has_moved:
+        for tile in session.reachable_for(active):
+            rect = tile_rect(*tile, TILE_SIZE)
+            items[("move", tile)] = (None, rect, lambda surface, rect=rect: draw_tile_highlight(surface, rect))
+
+    if session.awaiting_input() and session.mode in ["attack", "magic"] and session.selected_attack:
+        for target in session.targets_in_range(session.selected_attack):
+            rect = tile_rect(target.x, target.y, TILE_SIZE)
+            items[("target", id(target))] = (None, rect, lambda surface, rect=rect: draw_tile_highlight(surface, rect, RED, 3))
+    layer.update(items)
+
+def draw_log(surface, log):
+    with profiler.phase("battle_log"):
+        log_view.draw(surface, log)
+
+def update_ui_layer(layer, session, skill_buttons, skills_shown, hud_lines):
+    items = {}
+    move_btn, end_btn, action_buttons = ui_button_layout(SCREEN_HEIGHT)
+
+    for action_type, rect in action_buttons.items():
+        label = action_type.capitalize()
+        color = YELLOW if session.mode == action_type else GRAY
+        items[("action", action_type)] = (
+            color,
+            button_rect(font, rect, label),
+            lambda surface, rect=rect, label=label, color=color: draw_button(surface, font, rect, label, color)
+        )
+    for rect, label in [(move_btn, "Move"), (end_btn, "End Turn")]:
+        items[("button", label)] = (None, button_rect(font, rect, label), lambda surface, rect=rect, label=label: draw_button(surface, font, rect, label))
+
+    for skill_id, rect in skill_buttons.items():
+        label = skills_shown[skill_id]["name"]
+        color = YELLOW if skill_id == session.selected_attack else GRAY
+        items[("skill", skill_id)] = (
+            (label, color),
+            button_rect(font, rect, label, padding=5),
+            lambda surface, rect=rect, label=label, color=color: draw_button(surface, font, rect, label, color, padding=5)
+        )
 
-    chosen_name = draw_choose_player_character(
-        screen,
-        pygame.font.SysFont(None, int(32 * SCALE)),
-        starter_characters,
-        SCREEN_WIDTH,
-        SCREEN_HEIGHT,
-        SCALE,
-        WHITE,
-        BLACK
+    name = f"Active: {session.active.name}"
+    name_rect = pygame.Rect((10, SCREEN_HEIGHT - 100), font.size(name))
+    items["active"] = (name, name_rect, lambda surface: surface.blit(render_text(font, name, BLACK), name_rect))
+
+    if ai_turns.thinking:
+        # Animated dots beside the unit whose turn is being worked out.
+        dots = "." * (1 + pygame.time.get_ticks() // THINKING_DOT_MS % 3)
+        unit_tile = tile_rect(session.active.x, session.active.y, TILE_SIZE)
+        dots_rect = pygame.Rect((unit_tile.right + 2, unit_tile.y), font.size("..."))
+        items["thinking"] = (dots, dots_rect, lambda surface: surface.blit(render_text(font, dots, BLACK), dots_rect))
+
+    items["log"] = (
+        log_view.sync(session.battle_log),
+        log_view.rect,
+        lambda surface: draw_log(surface, session.battle_log)
     )
 
-    player_character = load_character_by_name(chosen_name, campaign_name)
-
-    enemy = load_character_by_name("Vaelith the Hollow", campaign_name)
-    enemy.team = "enemy"
-    enemy.role = "enemy_hero"
-    enemy.x = 8
-    enemy.y = 8
-    enemy.has_moved = False
-
-    goblin = load_character_by_name("Goblin Grunt", campaign_name)
-    goblin.team = "enemy"
-    goblin.role = "enemy"
-    goblin.x = 9
-    goblin.y = 9
-    goblin.has_moved = False
-
-    all_units = party + [enemy, goblin]
-    turn_order = sorted(all_units, key=roll_initiative, reverse=True)
-    return all_units, turn_order, party, player_character
-
-def move_enemy_wrapper(character, x, y):
-    return move_character(all_units, character, x, y)
-
-def get_character_wrapper(x, y):
-    return get_character_at(all_units, x, y)
-
-def campaign_file(campaign, filename):
-    return os.path.join("campaigns", campaign, filename)
-
-# Main Menu
-selection = run_main_menu(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT)
+    if hud_lines:
+        hud_rect = profiler_hud_rect(log_font, hud_lines)
+        items["profiler"] = (hud_lines, hud_rect, lambda surface: draw_profiler_hud(surface, log_font, hud_rect, hud_lines))
+    layer.update(items)
+    return move_btn, end_btn, action_buttons
 
 # Game state setup
-all_units = []
-turn_order = []
-party = []
-player_character = None
-turn_index = 0
-selected_character = None
+session = None
 running = False
 skill_buttons = {}
+skills_shown = {}
 last_mode = None
-game_over = False
-victory = False
-attacks_data = {}
 selected_campaign = None
+replay_player = None
+autosaved_turn = None
+show_profiler = args.profile_hud
+hud_lines = []
+battle_name = time.strftime("battle_%Y%m%d_%H%M%S")
 
-if selection == "new_game":
-    selected_campaign = run_campaign_select(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT)
-
-    skills_path = campaign_file(selected_campaign, "skills.json")
+# Main Menu
+preload_battle_assets(None)
+if args.replay:
+    selection = "replay"
+else:
+    selection = run_main_menu(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT, scheduler)
+    while selection == "load_game":
+        save_path = latest_save()
+        if save_path is not None:
+            break
+        tracer.note("ui", "LOAD", "No saved games found.")
+        selection = run_main_menu(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT, scheduler)
+
+if selection == "replay":
     try:
-        with open(skills_path) as f:
-            attacks_data = json.load(f)
-    except FileNotFoundError:
-        print(f"[ERROR] Could not load skills.json for campaign '{selected_campaign}' at {skills_path}")
+        replay_player = Replay.load(args.replay).start(log=BattleLog())
+    except (ReplayError, OSError, KeyError, ValueError) as e:
+        print(f"[ERROR] Could not load replay '{args.replay}': {e}")
         pygame.quit()
         sys.exit()
+    session = replay_player.session
+    next_replay_step = 0
+    running = True
+elif selection == "new_game":
+    selected_campaign = run_campaign_select(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT, scheduler)
+    preload_battle_assets(selected_campaign)
+
+    draw_choose_player_character(
+        screen,
+        get_font(None, int(32 * SCALE)),
+        load_starter_characters(selected_campaign),
+        SCREEN_WIDTH,
+        SCREEN_HEIGHT,
+        SCALE,
+        WHITE,
+        BLACK,
+        scheduler
+    )
 
-    all_units, turn_order, party, player_character = initialize_characters(selected_campaign)
-    turn_index = 0
-    selected_character = turn_order[turn_index]
-    selected_character.has_moved = False
-    selected_character.ready_to_move = False
+    try:
+        battle_log = BattleLog(history_path=history_path_for(battle_name))
+        session = BattleSession.from_campaign(
+            selected_campaign,
+            grid_width=GRID_WIDTH,
+            grid_height=GRID_HEIGHT,
+            log=battle_log,
+            planner=planner
+        )
+    except FileNotFoundError as e:
+        print(f"[ERROR] Could not load campaign '{selected_campaign}': {e}")
+        pygame.quit()
+        sys.exit()
+    tracer.note("ui", "REPLAY", f"Recording battle with seed {session.seed}")
+    running = True
+elif selection == "load_game":
+    try:
+        session = load_game(
+            save_path,
+            log=BattleLog(history_path=history_path_for(battle_name)),
+            planner=planner
+        )
+    except (SaveError, OSError, KeyError, ValueError) as e:
+        print(f"[ERROR] Could not load save '{save_path}': {e}")
+        pygame.quit()
+        sys.exit()
+    tracer.note("ui", "LOAD", f"Loaded {save_path}")
     running = True
 else:
     pygame.quit()
     sys.exit()
 
-while running:
-    if game_over:
-        quit_btn = draw_game_over_screen(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT)
-        pygame.display.flip()
+preload_battle_assets(session.setup.get("campaign"))
+floor = assets.sprite([FLOOR_TILE], SPRITE_SIZE, wait=True)
+renderer = LayeredRenderer(screen, build_background(SCREEN_WIDTH, SCREEN_HEIGHT, TILE_SIZE, floor).convert())
 
-        for event in pygame.event.get():
+while running:
+    profiler.next_frame()
+
+    # AI turns play out at full frame rate; waiting on the player sleeps.
+    scheduler.set_active("ai", replay_player is None and not session.done and not session.awaiting_input())
+    scheduler.set_active("replay", replay_player is not None and not replay_player.finished)
+
+    if replay_player is None and session.turns_taken != autosaved_turn:
+        # Only the snapshot is taken here; encoding and writing happen on the save thread.
+        with profiler.phase("autosave"):
+            autosaver.save(session)
+        autosaved_turn = session.turns_taken
+
+    if session.game_over:
+        with profiler.phase("end_screen"):
+            quit_btn = draw_game_over_screen(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT)
+            pygame.display.flip()
+
+        with profiler.phase("wait"):
+            events = scheduler.events()
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -224,11 +327,14 @@ while running:
                     running = False
         continue
 
-    if victory:
-        save_btn, next_btn, quit_btn = draw_victory_screen(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT)
-        pygame.display.flip()
+    if session.victory:
+        with profiler.phase("end_screen"):
+            save_btn, next_btn, quit_btn = draw_victory_screen(screen, font, SCREEN_WIDTH, SCREEN_HEIGHT)
+            pygame.display.flip()
 
-        for event in pygame.event.get():
+        with profiler.phase("wait"):
+            events = scheduler.events()
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
@@ -236,192 +342,135 @@ while running:
                 if quit_btn.collidepoint(mx, my):
                     running = False
                 elif save_btn.collidepoint(mx, my):
-                    print("[VICTORY] Save clicked! (stub)")
+                    tracer.note("ui", "SAVE", f"Saved to {save_game(session, save_path_for(QUICKSAVE_NAME), save_writer)}")
                 elif next_btn.collidepoint(mx, my):
                     print("[VICTORY] Next clicked! (stub)")
         continue
 
-    screen.fill(WHITE)
-
-    if mode != last_mode:
-        if selected_character.team == "player" and mode in ["attack", "magic"]:
-            skill_buttons = generate_skill_buttons(selected_character, attacks_data)
-        else:
-            skill_buttons = {}
-        last_mode = mode
-
-    draw_grid(screen, SCREEN_WIDTH, SCREEN_HEIGHT, TILE_SIZE)
-    name_surface = font.render(f"Active: {selected_character.name}", True, BLACK)
-    screen.blit(name_surface, (10, SCREEN_HEIGHT - 100))
-
-    move_btn, end_btn, action_buttons = draw_ui_buttons(screen, font, SCREEN_HEIGHT, mode)
-    draw_battle_log(screen, log_font, battle_log, SCREEN_WIDTH, SCREEN_HEIGHT)
-
-    if mode in ["attack", "magic"]:
-        render_skill_buttons(screen, font, attacks_data, skill_buttons, selected_attack)
-
-    if selected_character.current_hp <= 0:
-        print(f"[SKIP] {selected_character.name} is KO'd — skipping turn")
-        turn_index, selected_character = advance_turn(turn_order, turn_index)
-        if selected_character is None:
-            game_over = True
-        continue
-
-    if selected_character.team != "player" and selected_character.role in ["enemy", "enemy_hero"]:
-        print(f"\n[ENEMY TURN] {selected_character.name}")
-        result = enemy_take_turn(
-            selected_character,
-            all_units,
-            attacks_data,
-            move_enemy_wrapper,
-            get_character_wrapper
-        )
-        if not result:
-            print(f"{selected_character.name} had no valid action.")
-        elif result.get("action") == "move":
-            print(f"[ENEMY MOVE] {result['attacker'].name} moved toward {result['target'].name}")
-        elif result.get("action") == "none":
-            print(f"{result['attacker'].name} could not act this turn.")
-        else:
-            attacker = result["attacker"]
-            target = result["target"]
-            skill_id = result["attack_id"]
-            skill = attacks_data[str(skill_id)]
-            category = result["type"]
-
-            combat_result = resolve_attack(attacker, target, skill, category, turn_order, all_units, add_to_log)
-            for line in combat_result["log"]:
-                print(f"[ENEMY LOG] {line}")
-            add_to_log("\n".join(combat_result["log"]))
-            if combat_result["victory"]:
-                victory = True
-
-        selected_character.has_moved = False
-        selected_character.ready_to_move = False
-        mode = "idle"
-        selected_attack = None
-        turn_index, selected_character = advance_turn(turn_order, turn_index)
-        if selected_character is None:
-            game_over = True
-        continue
-
-    if selected_character.team == "player" and mode == "move" and not selected_character.has_moved:
-        highlight_movement_tiles(screen, selected_character, GRID_WIDTH, GRID_HEIGHT, MOVE_RANGE, TILE_SIZE)
+    if replay_player is not None:
+        # Recorded actions play one at a time so the battle can be followed.
+        now = pygame.time.get_ticks()
+        if now >= next_replay_step and not replay_player.finished:
+            with profiler.phase("replay"):
+                replay_player.advance()
+            next_replay_step = now + REPLAY_STEP_MS / max(args.replay_speed, 0.01)
+        if session.done:
+            continue
+    elif not session.awaiting_input():
+        # AI turns are worked out on a background thread; a frame only starts
+        # one or applies a finished one, and keeps drawing in between.
+        with profiler.phase("ai"):
+            while ai_turns.update(session) and not session.done and scheduler.within_budget():
+                pass
+        if session.done:
+            continue
 
-    if mode in ["attack", "magic"] and selected_attack:
-        atk_range = attacks_data[str(selected_attack)]["range"]
-        for target in all_units:
-            if target.team != selected_character.team:
-                dx = target.x - selected_character.x
-                dy = target.y - selected_character.y
-                dist = math.sqrt(dx ** 2 + dy ** 2)
-                if dist <= atk_range:
-                    pygame.draw.rect(screen, RED, (target.x * TILE_SIZE, target.y * TILE_SIZE, TILE_SIZE, TILE_SIZE), 3)
+    selected_character = session.active
+
+    if session.mode != last_mode:
+        with profiler.phase("skill_buttons"):
+            if selected_character.team == "player" and session.mode in ["attack", "magic"]:
+                skill_buttons = generate_skill_buttons(selected_character, session.attacks_data, session.mode)
+            else:
+                skill_buttons = {}
+            skills_shown = {skill_id: session.skill_for(skill_id) for skill_id in skill_buttons}
+        last_mode = session.mode
+
+    if not show_profiler:
+        hud_lines = []
+    elif not hud_lines or profiler.frame_count % HUD_REFRESH_FRAMES == 0:
+        hud_lines = profiler.hud_lines()
+
+    with profiler.phase("units"):
+        update_unit_layer(renderer.layer("units"), session)
+    with profiler.phase("overlay"):
+        update_overlay_layer(renderer.layer("overlay"), session)
+    with profiler.phase("ui"):
+        move_btn, end_btn, action_buttons = update_ui_layer(renderer.layer("ui"), session, skill_buttons, skills_shown, hud_lines)
+    with profiler.phase("present"):
+        renderer.present()
+
+    with profiler.phase("wait"):
+        events = scheduler.events()
+
+    with profiler.phase("input"):
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
 
-    draw_units(screen, font, all_units, selected_character, TILE_SIZE)
+            if event.type == pygame.MOUSEWHEEL and log_view.rect.collidepoint(pygame.mouse.get_pos()):
+                log_view.scroll_by(session.battle_log, event.y)
+                continue
 
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_profiler = not show_profiler
+                continue
 
-        if selected_character.team != "player":
-            continue
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F5 and replay_player is None:
+                tracer.note("ui", "SAVE", f"Quicksaved to {save_game(session, save_path_for(QUICKSAVE_NAME), save_writer)}")
+                continue
 
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            mx, my = pygame.mouse.get_pos()
+            if replay_player is not None or not session.awaiting_input():
+                continue
 
-            skill_clicked = False
-            if mode in ["attack", "magic"] and not selected_attack:
-                for skill_id, rect in skill_buttons.items():
-                    if rect.collidepoint(mx, my):
-                        selected_attack = skill_id
-                        print(f"[{mode.upper()} SELECTED] {attacks_data[skill_id]['name']}")
-                        skill_clicked = True
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                mx, my = pygame.mouse.get_pos()
+                mode = session.mode
+
+                skill_clicked = False
+                if mode in ["attack", "magic"] and not session.selected_attack:
+                    for skill_id, rect in skill_buttons.items():
+                        if rect.collidepoint(mx, my):
+                            session.selected_attack = skill_id
+                            tracer.note("ui", f"{mode.upper()} SELECTED", session.skill_for(skill_id)["name"])
+                            skill_clicked = True
+                            break
+                    if skill_clicked:
+                        continue
+
+                for action_name, btn in action_buttons.items():
+                    if btn.collidepoint(mx, my):
+                        if mode == action_name:
+                            tracer.note("ui", "CANCEL", f"{action_name} mode canceled")
+                            session.mode = "idle"
+                            session.selected_attack = None
+                        else:
+                            session.mode = action_name
+                            session.selected_attack = None
+                            tracer.note("ui", f"{action_name.upper()} MODE", f"{selected_character.name} is choosing a {action_name} skill.")
                         break
-                if skill_clicked:
-                    continue
-
-            for action_name, btn in action_buttons.items():
-                if btn.collidepoint(mx, my):
-                    if mode == action_name:
-                        print(f"[CANCEL] {action_name} mode canceled")
-                        mode = "idle"
-                        selected_attack = None
-                    else:
-                        mode = action_name
-                        selected_attack = None
-                        print(f"[{action_name.upper()} MODE] {selected_character.name} is choosing a {action_name} skill.")
-                    break
 
-            if move_btn.collidepoint(mx, my):
-                mode = "move"
-                selected_character.ready_to_move = True
-                print(f"[MOVE MODE] {selected_character.name} is preparing to move.")
-
-            elif end_btn.collidepoint(mx, my):
-                selected_character.has_moved = False
-                selected_character.ready_to_move = False
-                mode = "idle"
-                selected_attack = None
-                turn_index, selected_character = advance_turn(turn_order, turn_index)
-                if selected_character is None:
-                    game_over = True
-                print(f"[TURN ENDED] Switching to {selected_character.name if selected_character else 'None'}")
-                continue
+                if move_btn.collidepoint(mx, my):
+                    session.mode = "move"
+                    selected_character.ready_to_move = True
+                    tracer.note("ui", "MOVE MODE", f"{selected_character.name} is preparing to move.")
 
-            elif mode == "move" and not selected_character.has_moved:
-                gx, gy = mx // TILE_SIZE, my // TILE_SIZE
-                moved = move_character(all_units, selected_character, gx, gy)
-                if moved:
-                    selected_character.has_moved = True
-                    mode = "idle"
-
-            elif mode in ["attack", "magic"] and selected_attack:
-                gx, gy = mx // TILE_SIZE, my // TILE_SIZE
-                target = get_character_at(all_units, gx, gy)
-
-                if target and target.team != selected_character.team:
-                    dx = target.x - selected_character.x
-                    dy = target.y - selected_character.y
-                    dist = math.sqrt(dx ** 2 + dy ** 2)
-
-                    if selected_attack == "weapon_attack":
-                        weapon = selected_character.equipment.weapon
-                        if not weapon:
-                            print(f"[FAIL] {selected_character.name} has no weapon.")
-                            continue
-
-                        if dist > 1:
-                            print("Target out of weapon range")
-                            continue
-
-                        skill = {
-                            "name": "Weapon Attack",
-                            "damage": weapon.atk_roll
-                        }
-                        combat_result = resolve_attack(selected_character, target, skill, "attack", turn_order, all_units, add_to_log)
-
-                    else:
-                        atk = attacks_data[str(selected_attack)]
-                        if dist > atk["range"]:
-                            print("Target out of range for skill.")
-                            continue
-
-                        skill_type = atk.get("category", "attack")
-                        combat_result = resolve_attack(selected_character, target, atk, skill_type, turn_order, all_units, add_to_log)
-
-                    for line in combat_result["log"]:
-                        print(f"[PLAYER LOG] {line}")
-                    add_to_log("\n".join(combat_result["log"]))
-                    if combat_result["victory"]:
-                        victory = True
-
-                    selected_character.has_moved = True
-                    selected_attack = None
-                    mode = "idle"
-
-    pygame.display.flip()
-    clock.tick(60)
+                elif end_btn.collidepoint(mx, my):
+                    session.apply_action({"action": "end_turn"})
+                    tracer.note("ui", "TURN ENDED", f"Switching to {session.active.name if session.active else 'None'}")
+                    # The rest of this batch was aimed at the unit that just ended its turn.
+                    break
 
+                elif mode == "move" and not selected_character.has_moved:
+                    gx, gy = mx // TILE_SIZE, my // TILE_SIZE
+                    session.apply_action({"action": "move", "x": gx, "y": gy})
+
+                elif mode in ["attack", "magic"] and session.selected_attack:
+                    gx, gy = mx // TILE_SIZE, my // TILE_SIZE
+                    session.apply_action({
+                        "action": "attack",
+                        "attack_id": session.selected_attack,
+                        "target": session.get_unit_at(gx, gy)
+                    })
+
+if replay_player is None and session.actions:
+    Replay.from_session(session).save(replay_path_for(battle_name))
+ai_turns.cancel()
+assets.close()
+profiler.finish()
+if args.profile_trace:
+    tracer.note("ui", "PROFILE", f"Wrote {len(profiler.trace)} sampled frames to {profiler.export_chrome_trace(args.profile_trace)}")
+save_writer.close()
+session.battle_log.close()
 pygame.quit()
 sys.exit()
@@ -0,0 +1,82 @@
+import os
+
+from .campaign_cache import load_campaign
+from .character import _create_character_from_dict
+
+
+CAMPAIGNS_DIR = "campaigns"
+REQUIRED_FILES = ("characters.json", "items.json", "skills.json")
+
+
+class CampaignRepository:
+    # Parses each campaign file once and indexes its records.
+    def __init__(self, campaign_name: str, root: str = CAMPAIGNS_DIR):
+        self.name = campaign_name
+        self.path = os.path.join(root, campaign_name)
+        self._tables = None
+        self.reload()
+
+    def reload(self):
+        tables = load_campaign(self.path)
+        for required in REQUIRED_FILES:
+            if required not in tables:
+                tables.close()
+                raise FileNotFoundError(os.path.join(self.path, required))
+        self.close()
+        self._tables = tables
+        self.metadata = tables.get("campaign_metadata.json", {})
+        self.characters = tables["characters.json"]
+        self.items = tables["items.json"]
+        self.skills = tables["skills.json"]
+
+        by_name = getattr(self.characters, "by_key", None)
+        if by_name is None:
+            by_name = {}
+            for c in reversed(self.characters):
+                by_name[c["name"]] = c
+        self.characters_by_name = by_name
+
+    def character_data(self, name: str):
+        match = self.characters_by_name.get(name)
+        if not match:
+            raise ValueError(f"Character with name '{name}' not found.")
+        return match
+
+    def item(self, item_id):
+        return self.items[str(item_id)]
+
+    def skill(self, skill_id):
+        return self.skills[str(skill_id)]
+
+    def starters(self):
+        return [c for c in self.characters if c.get("is_starter")]
+
+    def load_character(self, name: str):
+        return _create_character_from_dict(self.character_data(name), self.items)
+
+    def close(self):
+        # Unmaps the campaign cache; records not read yet can't be after this.
+        if self._tables is not None:
+            self._tables.close()
+            self._tables = None
+
+
+_repositories = {}
+
+
+def get_repository(campaign_name: str, root: str = CAMPAIGNS_DIR):
+    key = (os.path.abspath(root), campaign_name)
+    repository = _repositories.get(key)
+    if repository is None:
+        repository = CampaignRepository(campaign_name, root)
+        _repositories[key] = repository
+    return repository
+
+
+def close_repository(campaign_name: str, root: str = CAMPAIGNS_DIR):
+    # Drops a campaign from the shared repositories and releases its cache,
+    # e.g. when switching campaigns.
+    repository = _repositories.pop((os.path.abspath(root), campaign_name), None)
+    if repository is not None:
+        repository.close()
+    return repository is not None
@@ -0,0 +1,292 @@
+from collections.abc import Mapping, Sequence
+import argparse
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+
+from utils.trace import tracer
+
+
+MAGIC = b"ELRC"
+FORMAT_VERSION = 1
+CACHE_DIR = ".cache"
+CACHE_FILE = "campaign.bin"
+PREFIX = struct.Struct("<4sI")  # magic, header length
+
+
+class RecordTable(Mapping):
+    # Records of one source file, decoded from the cache on first access.
+    def __init__(self, keys, spans, buffer, base):
+        self._keys = keys
+        self._spans = spans
+        self._buffer = buffer
+        self._base = base
+        self._decoded = {}
+        self._index = {}
+        for i, key in enumerate(keys):
+            self._index.setdefault(key, i)
+
+    def record(self, i):
+        value = self._decoded.get(i)
+        if value is None:
+            offset, length = self._spans[i]
+            start = self._base + offset
+            value = marshal.loads(self._buffer[start:start + length])
+            self._decoded[i] = value
+        return value
+
+    def __getitem__(self, key):
+        return self.record(self._index[key])
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+
+class RecordList(Sequence):
+    # A list source; by_key looks records up by their "name" (or "id").
+    def __init__(self, table):
+        self.by_key = table
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.by_key.record(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.by_key.record(i)
+
+    def __len__(self):
+        return len(self.by_key._spans)
+
+
+class CampaignTables(dict):
+    # {filename: data} for one campaign. Owns the cache mapping the record
+    # tables read from; close() releases it, after which they can't be used.
+    def __init__(self, tables, buffer=None):
+        super().__init__(tables)
+        self.buffer = buffer
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def cache_path(campaign_path):
+    return os.path.join(campaign_path, CACHE_DIR, CACHE_FILE)
+
+
+def _source_files(campaign_path):
+    return sorted(f for f in os.listdir(campaign_path) if f.endswith(".json"))
+
+
+def _record_key(record, index):
+    if isinstance(record, dict):
+        for field in ("name", "id"):
+            if field in record:
+                return str(record[field])
+    return str(index)
+
+
+def _read_source(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw, json.loads(raw)
+
+
+def build_cache(campaign_path, parsed=None):
+    # Compiles every *.json in the campaign into one cache file.
+    # parsed maps filename -> (raw bytes, value) for sources already read.
+    parsed = parsed or {}
+    sources = {}
+    blob = bytearray()
+
+    for filename in _source_files(campaign_path):
+        path = os.path.join(campaign_path, filename)
+        stat = os.stat(path)
+        raw, value = parsed.get(filename) or _read_source(path)
+
+        if isinstance(value, dict):
+            kind = "dict"
+            records = [(str(k), v) for k, v in value.items()]
+        elif isinstance(value, list):
+            kind = "list"
+            records = [(_record_key(v, i), v) for i, v in enumerate(value)]
+        else:
+            kind = "value"
+            records = [("", value)]
+
+        keys = []
+        spans = []
+        for key, record in records:
+            payload = marshal.dumps(record)
+            keys.append(key)
+            spans.append((len(blob), len(payload)))
+            blob += payload
+
+        sources[filename] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": hashlib.sha256(raw).digest(),
+            "kind": kind,
+            "keys": keys,
+            "spans": spans,
+        }
+
+    header = marshal.dumps({
+        "format": FORMAT_VERSION,
+        "python": tuple(sys.version_info[:2]),
+        "sources": sources,
+    })
+
+    target = cache_path(campaign_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        f.write(blob)
+    os.replace(tmp, target)
+    return target
+
+
+def _source_state(path, entry):
+    # "same", "touched" (new mtime, same contents) or None when edited.
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if stat.st_mtime_ns == entry["mtime_ns"] and stat.st_size == entry["size"]:
+        return "same"
+    # Touched but maybe not edited (checkouts, copies): fall back to the hash.
+    with open(path, "rb") as f:
+        if hashlib.sha256(f.read()).digest() != entry["sha256"]:
+            return None
+    entry["mtime_ns"] = stat.st_mtime_ns
+    entry["size"] = stat.st_size
+    return "touched"
+
+
+def _restamp(campaign_path, header, blob):
+    # Rewrites the header with the new source stamps so the next load takes
+    # the fast path again; the records themselves are copied unchanged.
+    header_bytes = marshal.dumps(header)
+    target = cache_path(campaign_path)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(blob)
+    os.replace(tmp, target)
+
+
+def _open_cache(campaign_path):
+    path = cache_path(campaign_path)
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+    with f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+
+    try:
+        magic, header_length = PREFIX.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("bad magic")
+        header = marshal.loads(buffer[PREFIX.size:PREFIX.size + header_length])
+    except (struct.error, ValueError, EOFError, TypeError):
+        buffer.close()
+        return None
+
+    sources = header.get("sources", {})
+    fresh = (
+        header.get("format") == FORMAT_VERSION
+        and header.get("python") == tuple(sys.version_info[:2])
+        and sorted(sources) == _source_files(campaign_path)
+    )
+    states = []
+    for name, entry in sources.items():
+        if not fresh:
+            break
+        states.append(_source_state(os.path.join(campaign_path, name), entry))
+        fresh = states[-1] is not None
+    if not fresh:
+        buffer.close()
+        return None
+
+    base = PREFIX.size + header_length
+    if "touched" in states:
+        try:
+            _restamp(campaign_path, header, buffer[base:])
+        except OSError as e:
+            tracer.note("ui", "CACHE", f"Could not update campaign cache for {campaign_path}: {e}")
+    tables = {}
+    for filename, entry in sources.items():
+        table = RecordTable(entry["keys"], entry["spans"], buffer, base)
+        if entry["kind"] == "dict":
+            tables[filename] = table
+        elif entry["kind"] == "list":
+            tables[filename] = RecordList(table)
+        else:
+            tables[filename] = table[""]
+    return CampaignTables(tables, buffer)
+
+
+def load_campaign(campaign_path):
+    # Returns {filename: data} for every *.json in the campaign, served from
+    # the binary cache when it is current and rebuilt from JSON when not.
+    # Close the result (or use it as a context manager) to unmap the cache.
+    tables = _open_cache(campaign_path)
+    if tables is not None:
+        return tables
+
+    parsed = {}
+    for filename in _source_files(campaign_path):
+        parsed[filename] = _read_source(os.path.join(campaign_path, filename))
+
+    try:
+        build_cache(campaign_path, parsed)
+    except OSError as e:
+        tracer.note("ui", "CACHE", f"Could not write campaign cache for {campaign_path}: {e}")
+
+    return CampaignTables({filename: value for filename, (raw, value) in parsed.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile campaign JSON into binary caches.")
+    parser.add_argument("campaigns", nargs="*", help="Campaign directories (default: every campaign in campaigns/)")
+    args = parser.parse_args(argv)
+
+    paths = args.campaigns or [
+        os.path.join("campaigns", d) for d in sorted(os.listdir("campaigns"))
+        if os.path.isdir(os.path.join("campaigns", d))
+    ]
+    for path in paths:
+        target = build_cache(path)
+        print(f"[CACHE] {path} -> {target} ({os.path.getsize(target)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,9 @@
 from dataclasses import dataclass
+from .dice import evaluate_expression
 from .equipment import Equipment
 from .inventory import Inventory
 from .item import Item
-import json
-import os
-import random
-import re
+from utils.trace import RollEvent, tracer
 
 
 @dataclass
@@ -52,27 +50,69 @@ class Character:
                 self.ac += item.ac_bonus
                 self.initiative += item.init_bonus
 
-    def attack_roll(self, equipment: Equipment):
+    def attack_roll(self, equipment: Equipment, rng=None):
         if equipment and equipment.atk_roll:
-            total, breakdown = evaluate_expression(equipment.atk_roll)
-            print(f"{self.name} rolls with weapon: {breakdown} = {total}")
+            total, breakdown = evaluate_expression(equipment.atk_roll, rng)
+            if tracer.enabled("roll"):
+                tracer.emit(RollEvent(self.name, "weapon", breakdown, total))
             return total
         else:
-            print(f"{self.name} has no weapon attack roll.")
+            tracer.note("roll", "WEAPON", f"{self.name} has no weapon attack roll.")
             return 0
 
 
+ITEM_FIELDS = (
+    "item_id", "item_key", "slot", "name", "atk_roll", "attack_bonus", "ac_bonus",
+    "init_bonus", "spell_attack_bonus", "spell_save", "stat_bonuses", "description"
+)
+EQUIPMENT_SLOTS = ("helmet", "chest", "arms", "legs", "amulet", "ring1", "ring2", "weapon")
+
+
+def character_to_record(character: Character):
+    # Plain-data copy of a character and its items, for save files. Stats
+    # already include equipment bonuses.
+    items = list(character.inventory)
+    inventory_size = len(items)
+    equipped = []
+    for slot in EQUIPMENT_SLOTS:
+        item = getattr(character.equipment, slot)
+        if item is None:
+            equipped.append(None)
+            continue
+        index = next((i for i, owned in enumerate(items) if owned is item), None)
+        if index is None:
+            index = len(items)
+            items.append(item)
+        equipped.append(index)
+
+    return [
+        character.name, character.job, character.lvl, character.hp,
+        character.strength, character.dex, character.con, character.cha, character.wis, character.intel,
+        character.ac, character.initiative, character.role, list(character.attack_ids),
+        [[dict(v) if isinstance(v, dict) else v for v in (getattr(item, f) for f in ITEM_FIELDS)] for item in items],
+        inventory_size,
+        equipped
+    ]
+
+
+def character_from_record(record):
+    (name, job, lvl, hp, strength, dex, con, cha, wis, intel, ac, initiative, role, attack_ids,
+     item_records, inventory_size, equipped) = record
+    items = [Item(*fields) for fields in item_records]
+    equipment = Equipment(*[None if index is None else items[index] for index in equipped])
+    return Character(
+        name, job, lvl, hp, strength, dex, con, cha, wis, intel, ac, initiative,
+        Inventory(items[:inventory_size]), equipment, role, list(attack_ids)
+    )
+
+
 def load_character_by_name(character_name: str, campaign_name: str):
-    path = os.path.join("campaigns", campaign_name, "characters.json")
-    with open(path) as f:
-        characters = json.load(f)
-    match = next((char for char in characters if char.get("name") == character_name), None)
-    if not match:
-        raise ValueError(f"Character with name '{character_name}' not found.")
-    return _create_character_from_dict(match, campaign_name)
+    # Imported here because res.campaign builds characters with this module.
+    from .campaign import get_repository
+    return get_repository(campaign_name).load_character(character_name)
 
 
-def _create_character_from_dict(character_data: dict, campaign_name: str):
+def _create_character_from_dict(character_data: dict, items_json: dict):
     name = character_data["name"]
     job = character_data["job"]
     lvl = character_data["lvl"]
@@ -85,43 +125,40 @@ def _create_character_from_dict(character_data: dict, campaign_name: str):
     intel = character_data["intel"]
     starting_equipment = character_data["starting_equipment"]
     role = character_data.get("role", "starter")
-    attack_ids = character_data.get("attacks", [])
+    attack_ids = list(character_data.get("attacks", []))
 
     ac = 10
     initiative = 0
     inventory = Inventory([])
 
-    items_path = os.path.join("campaigns", campaign_name, "items.json")
-    with open(items_path) as f_in:
-        items_json = json.load(f_in)
-        for item_id in starting_equipment:
-            item_json = items_json[str(item_id)]
-            item_slot = item_json["slot"]
-            item_name = item_json["name"]
-            item_atk_roll = item_json["atk_roll"]
-            item_attack_bonus = item_json["attack_bonus"]
-            item_ac_bonus = item_json["ac_bonus"]
-            item_init_bonus = item_json["init_bonus"]
-            item_spell_attack_bonus = item_json["spell_attack_bonus"]
-            item_spell_save = item_json["spell_save"]
-            item_stat_bonuses = item_json["stat_bonuses"]
-            item_description = item_json["description"]
-
-            new_item = Item(
-                item_id,
-                "",
-                item_slot,
-                item_name,
-                item_atk_roll,
-                item_attack_bonus,
-                item_ac_bonus,
-                item_init_bonus,
-                item_spell_attack_bonus,
-                item_spell_save,
-                item_stat_bonuses,
-                item_description
-            )
-            inventory.add_item(new_item)
+    for item_id in starting_equipment:
+        item_json = items_json[str(item_id)]
+        item_slot = item_json["slot"]
+        item_name = item_json["name"]
+        item_atk_roll = item_json["atk_roll"]
+        item_attack_bonus = item_json["attack_bonus"]
+        item_ac_bonus = item_json["ac_bonus"]
+        item_init_bonus = item_json["init_bonus"]
+        item_spell_attack_bonus = item_json["spell_attack_bonus"]
+        item_spell_save = item_json["spell_save"]
+        item_stat_bonuses = dict(item_json["stat_bonuses"])
+        item_description = item_json["description"]
+
+        new_item = Item(
+            item_id,
+            "",
+            item_slot,
+            item_name,
+            item_atk_roll,
+            item_attack_bonus,
+            item_ac_bonus,
+            item_init_bonus,
+            item_spell_attack_bonus,
+            item_spell_save,
+            item_stat_bonuses,
+            item_description
+        )
+        inventory.add_item(new_item)
 
     helmet = None
     chest = None
@@ -182,37 +219,3 @@ def _create_character_from_dict(character_data: dict, campaign_name: str):
     new_character.initial_stat_calculations()
     return new_character
 
-
-def roll_die(num_rolls, die_size):
-    return [random.randint(1, die_size) for _ in range(num_rolls)]
-
-
-def evaluate_expression(expression):
-    expression = re.sub(r"\s+", "", expression)  # Strip all spaces
-    tokens = re.findall(r"[-+]?(?:\d*d\d+|\d+)", expression)
-
-    total = 0
-    breakdown = []
-
-    for token in tokens:
-        operator = "+" if token[0] not in "-+" else token[0]
-        token = token.lstrip("+-")
-
-        if "d" in token:
-            num_rolls, die_size = token.split("d")
-            num_rolls = int(num_rolls) if num_rolls else 1
-            die_size = int(die_size)
-            rolls = roll_die(num_rolls, die_size)
-            result = sum(rolls)
-            breakdown.append(f"{operator} ({' + '.join(map(str, rolls))})")
-        else:
-            result = int(token)
-            breakdown.append(f"{operator} {result}")
-
-        if operator == "+":
-            total += result
-        else:
-            total -= result
-
-    breakdown_string = " ".join(breakdown).lstrip("+ ")
-    return total, breakdown_string
@@ -0,0 +1,94 @@
+from functools import lru_cache
+import random
+import re
+
+
+_WHITESPACE = re.compile(r"\s+")
+_TOKEN = re.compile(r"[-+]?(?:\d*d\d+|\d+)")
+
+
+class DiceProgram:
+    # A dice expression parsed once into (sign, num_rolls, die_size) terms.
+    # Flat modifiers are folded into a single constant for the fast path.
+    __slots__ = ("expression", "terms", "dice", "constant")
+
+    def __init__(self, expression: str, terms: tuple):
+        self.expression = expression
+        self.terms = terms  # die_size is None for flat modifiers
+        self.dice = tuple(
+            (sign, num_rolls, range(1, die_size + 1))
+            for sign, num_rolls, die_size in terms
+            if die_size is not None
+        )
+        self.constant = sum(sign * value for sign, value, die_size in terms if die_size is None)
+
+    # rng is any random.Random-like stream; the global random module by default.
+    def roll_total(self, rng=None):
+        total = self.constant
+        choices = (rng or random).choices
+        for sign, num_rolls, faces in self.dice:
+            total += sign * sum(choices(faces, k=num_rolls))
+        return total
+
+    def roll(self, rng=None):
+        total = 0
+        breakdown = []
+
+        for sign, value, die_size in self.terms:
+            operator = "+" if sign > 0 else "-"
+            if die_size is not None:
+                rolls = roll_die(value, die_size, rng)
+                result = sum(rolls)
+                breakdown.append(f"{operator} ({' + '.join(map(str, rolls))})")
+            else:
+                result = value
+                breakdown.append(f"{operator} {result}")
+            total += sign * result
+
+        breakdown_string = " ".join(breakdown).lstrip("+ ")
+        return total, breakdown_string
+
+    def roll_many(self, count: int, rng=None):
+        totals = [self.constant] * count
+        choices = (rng or random).choices
+        for sign, num_rolls, faces in self.dice:
+            rolls = choices(faces, k=num_rolls * count)
+            for i in range(count):
+                start = i * num_rolls
+                totals[i] += sign * sum(rolls[start:start + num_rolls])
+        return totals
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression: str):
+    expression = _WHITESPACE.sub("", expression)
+    terms = []
+
+    for token in _TOKEN.findall(expression):
+        sign = -1 if token[0] == "-" else 1
+        token = token.lstrip("+-")
+
+        if "d" in token:
+            num_rolls, die_size = token.split("d")
+            terms.append((sign, int(num_rolls) if num_rolls else 1, int(die_size)))
+        else:
+            terms.append((sign, int(token), None))
+
+    return DiceProgram(expression, tuple(terms))
+
+
+def roll_die(num_rolls, die_size, rng=None):
+    randint = (rng or random).randint
+    return [randint(1, die_size) for _ in range(num_rolls)]
+
+
+def roll_total(expression, rng=None):
+    return compile_expression(expression).roll_total(rng)
+
+
+def roll_many(expression, count, rng=None):
+    return compile_expression(expression).roll_many(count, rng)
+
+
+def evaluate_expression(expression, rng=None):
+    return compile_expression(expression).roll(rng)
@@ -1,13 +1,28 @@
 import math
-from res.character import evaluate_expression
+from utils.movement import Terrain, reachable_tiles
+from utils.trace import DEBUG, tracer
 
 
-def enemy_take_turn(enemy, all_units, attacks_data, move_fn, get_fn):
-    target = get_closest_enemy(enemy, all_units)
+MOVE_RANGE = 3
+GRID_WIDTH = 16
+GRID_HEIGHT = 16
+
+
+def enemy_take_turn(enemy, all_units, attacks_data, move_fn, get_fn, reach_fn=None, field_fn=None, registry=None,
+                    planner=None, forecast=None, terrain=None):
+    if planner is not None:
+        reachable = reach_fn(enemy) if reach_fn else reachable_tiles(
+            enemy.x, enemy.y, MOVE_RANGE, terrain or Terrain(GRID_WIDTH, GRID_HEIGHT), get_fn
+        )
+        plan = planner.choose(enemy, all_units, attacks_data, reachable, forecast, terrain)
+        if plan is not None:
+            return carry_out_plan(enemy, plan, attacks_data, move_fn)
+
+    target = get_closest_enemy(enemy, all_units, registry)
     
     # 💥 Bail if no living enemy found
     if not target or target.current_hp <= 0:
-        print(f"[AI] {enemy.name} found no valid living targets.")
+        tracer.note("ai", "AI", f"{enemy.name} found no valid living targets.")
         return None
 
     dx = target.x - enemy.x
@@ -26,51 +41,69 @@ def enemy_take_turn(enemy, all_units, attacks_data, move_fn, get_fn):
             }
 
     # Try to move toward target
-    moved = move_towards(enemy, target, move_fn, get_fn)
+    reachable = reach_fn(enemy) if reach_fn else None
+    field = field_fn(target, enemy) if field_fn else None
+    moved = move_towards(enemy, target, move_fn, get_fn, reachable, field)
     if moved:
-        print(f"[AI] {enemy.name} moved toward {target.name}")
+        if tracer.enabled("ai", DEBUG):
+            tracer.note("ai", "AI", f"{enemy.name} moved toward {target.name}", DEBUG)
         return {"action": "move", "attacker": enemy, "target": target}
 
-    print(f"[AI] {enemy.name} could not act this turn.")
+    tracer.note("ai", "AI", f"{enemy.name} could not act this turn.")
     return {"action": "none", "attacker": enemy}
 
-def get_closest_enemy(enemy, units):
+def carry_out_plan(enemy, plan, attacks_data, move_fn):
+    moved = False
+    if plan.destination != (enemy.x, enemy.y):
+        moved = move_fn(enemy, *plan.destination)
+        if not moved:
+            tracer.note("ai", "AI", f"{enemy.name} could not reach {plan.destination}.")
+            return {"action": "none", "attacker": enemy}
+
+    if plan.attack_id is None:
+        if moved:
+            return {"action": "move", "attacker": enemy, "target": None}
+        return {"action": "none", "attacker": enemy}
+
+    atk = attacks_data[str(plan.attack_id)]
+    return {
+        "attacker": enemy,
+        "target": plan.target,
+        "attack_id": plan.attack_id,
+        "type": atk.get("category", "attack"),
+        "moved": moved
+    }
+
+def get_closest_enemy(enemy, units, registry=None):
+    if registry is not None:
+        return registry.nearest_opponent(enemy)
     opponents = [u for u in units if u.team != enemy.team]
     if not opponents:
         return None
     return min(opponents, key=lambda u: (u.x - enemy.x) ** 2 + (u.y - enemy.y) ** 2)
 
-def move_towards(enemy, target, move_fn, get_fn):
-    MOVE_RANGE = 3
-
-    best_dist = float("inf")
-    best_pos = None
+def move_towards(enemy, target, move_fn, get_fn, reachable=None, field=None):
+    if reachable is None:
+        reachable = reachable_tiles(enemy.x, enemy.y, MOVE_RANGE, Terrain(GRID_WIDTH, GRID_HEIGHT), get_fn)
 
-    for dx in range(-MOVE_RANGE, MOVE_RANGE + 1):
-        for dy in range(-MOVE_RANGE, MOVE_RANGE + 1):
-            if dx == 0 and dy == 0:
-                continue
+    def score(tx, ty):
+        straight_line = math.sqrt((tx - target.x) ** 2 + (ty - target.y) ** 2)
+        if field is None:
+            return (0, straight_line)
+        path = field.distance(tx, ty)
+        # Tiles walled off from the target rank after every tile with a path.
+        return (float("inf") if path is None else path, straight_line)
 
-            distance = math.sqrt(dx ** 2 + dy ** 2)
-            if distance > MOVE_RANGE:
-                continue
-
-            tx = enemy.x + dx
-            ty = enemy.y + dy
-
-            if not (0 <= tx < 16 and 0 <= ty < 16):
-                continue
-
-            if get_fn(tx, ty):
-                continue
+    best_score = score(enemy.x, enemy.y)
+    best_pos = None
 
-            dist_to_target = math.sqrt((tx - target.x) ** 2 + (ty - target.y) ** 2)
-            if dist_to_target < best_dist:
-                best_dist = dist_to_target
-                best_pos = (tx, ty)
+    for tx, ty in reachable:
+        tile_score = score(tx, ty)
+        if tile_score < best_score:
+            best_score = tile_score
+            best_pos = (tx, ty)
 
     if best_pos:
-        print(f"[AI] {enemy.name} moving from ({enemy.x},{enemy.y}) to {best_pos}")
         return move_fn(enemy, *best_pos)  # Only move once, here.
 
     return False
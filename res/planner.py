@@ -0,0 +1,397 @@
+from collections import namedtuple
+import atexit
+import math
+import multiprocessing
+import random
+import threading
+import time
+
+import numpy as np
+
+from .dice import compile_expression
+from .enemies import GRID_HEIGHT, GRID_WIDTH, MOVE_RANGE
+from utils.analytics import attack_odds, expression_pmf
+from utils.movement import Terrain, reachable_tiles
+from utils.trace import tracer
+
+
+KILL_BONUS = 10.0
+THREAT_WEIGHT = 0.25
+APPROACH_WEIGHT = 0.75
+
+# What a planner decided: where to stand, then optionally what to use on whom.
+Plan = namedtuple("Plan", "destination attack_id target")
+Action = namedtuple("Action", "destination attack_id target")  # target is a snapshot index
+
+
+class SimUnit:
+    __slots__ = ("index", "name", "team", "x", "y", "current_hp", "hp", "ac", "attack_ids",
+                 "attack_bonus", "save_dc", "save_bonus")
+
+    @classmethod
+    def from_unit(cls, index, unit):
+        sim = cls()
+        sim.index = index
+        sim.name = unit.name
+        sim.team = unit.team
+        sim.x = unit.x
+        sim.y = unit.y
+        sim.current_hp = unit.current_hp
+        sim.hp = unit.hp
+        sim.ac = unit.ac
+        sim.attack_ids = [str(a) for a in unit.attack_ids]
+        sim.attack_bonus = getattr(unit, "attack_bonus", 2)
+        sim.save_dc = getattr(unit, "save_dc", 8)
+        sim.save_bonus = getattr(unit, "save_bonus", 0)
+        return sim
+
+    def copy(self):
+        sim = SimUnit()
+        for slot in SimUnit.__slots__:
+            setattr(sim, slot, getattr(self, slot))
+        return sim
+
+
+class Snapshot:
+    # A picklable copy of the battle: plain units, the skills they use,
+    # the terrain and the upcoming turn order (as unit indices).
+    def __init__(self, units, skills, terrain, order):
+        self.units = units
+        self.skills = skills
+        self.terrain = terrain
+        self.order = order
+        self.cells = {(u.x, u.y): u for u in units if u.current_hp > 0}
+
+    @classmethod
+    def capture(cls, all_units, attacks_data, terrain=None, forecast=None):
+        units = [SimUnit.from_unit(i, u) for i, u in enumerate(all_units)]
+        skills = {}
+        for unit in units:
+            for attack_id in unit.attack_ids:
+                if attack_id not in skills and attack_id in attacks_data:
+                    skills[attack_id] = dict(attacks_data[attack_id])
+        index = {id(u): i for i, u in enumerate(all_units)}
+        order = [index[id(u)] for u in forecast or () if id(u) in index] or list(range(len(units)))
+        return cls(units, skills, terrain or Terrain(GRID_WIDTH, GRID_HEIGHT), order)
+
+    def copy(self):
+        # Skills, terrain and order are never mutated, so they are shared.
+        return Snapshot([u.copy() for u in self.units], self.skills, self.terrain, self.order)
+
+    def occupant(self, x, y):
+        return self.cells.get((x, y))
+
+    def move(self, unit, x, y):
+        del self.cells[(unit.x, unit.y)]
+        unit.x = x
+        unit.y = y
+        self.cells[(x, y)] = unit
+
+    def knock_out(self, unit):
+        if self.cells.get((unit.x, unit.y)) is unit:
+            del self.cells[(unit.x, unit.y)]
+
+    def opponents(self, unit):
+        return [u for u in self.units if u.team != unit.team and u.current_hp > 0]
+
+    def evaluate(self, team):
+        # Share of health held by team minus the share held by everyone else, in [-1, 1].
+        score = 0.0
+        for u in self.units:
+            share = u.current_hp / u.hp if u.hp else 0.0
+            score += share if u.team == team else -share
+        return score / len(self.units)
+
+
+def _distance(ax, ay, bx, by):
+    return math.sqrt((ax - bx) ** 2 + (ay - by) ** 2)
+
+
+def _roll(expression, rng):
+    program = compile_expression(expression)
+    total = program.constant
+    for sign, num_rolls, faces in program.dice:
+        total += sign * sum(rng.choices(faces, k=num_rolls))
+    return total
+
+
+def capped_damage(expression, current_hp):
+    # Expected damage actually dealt, since overkill is wasted.
+    offset, probs = expression_pmf(expression)
+    values = np.clip(np.arange(offset, offset + len(probs)), 0, current_hp)
+    return float(np.dot(values, probs))
+
+
+def resolve_sim_attack(snapshot, attacker, target, skill, rng):
+    # resolve_attack's dice on a snapshot, with a private random stream.
+    category = skill.get("category", "attack")
+    if category == "attack":
+        roll = rng.randint(1, 20)
+        hit = roll != 1 and (roll == 20 or roll + attacker.attack_bonus >= target.ac)
+    elif category == "magic":
+        hit = rng.randint(1, 20) + target.save_bonus < attacker.save_dc
+    else:
+        hit = False
+    if hit:
+        target.current_hp = max(0, target.current_hp - _roll(skill["damage"], rng))
+        if target.current_hp == 0:
+            snapshot.knock_out(target)
+
+
+def greedy_sim_turn(snapshot, unit, rng):
+    # The default AI on a snapshot: first skill in range on the closest
+    # opponent, otherwise the reachable tile nearest to it.
+    opponents = snapshot.opponents(unit)
+    if not opponents:
+        return
+    target = min(opponents, key=lambda u: (u.x - unit.x) ** 2 + (u.y - unit.y) ** 2)
+    distance = _distance(unit.x, unit.y, target.x, target.y)
+    for attack_id in unit.attack_ids:
+        skill = snapshot.skills.get(attack_id)
+        if skill and distance <= skill["range"]:
+            resolve_sim_attack(snapshot, unit, target, skill, rng)
+            return
+
+    best = distance
+    best_tile = None
+    for tile in reachable_tiles(unit.x, unit.y, MOVE_RANGE, snapshot.terrain, snapshot.occupant):
+        d = _distance(tile[0], tile[1], target.x, target.y)
+        if d < best:
+            best = d
+            best_tile = tile
+    if best_tile:
+        snapshot.move(unit, *best_tile)
+
+
+def apply_action(snapshot, actor, action, rng):
+    if action.destination != (actor.x, actor.y):
+        snapshot.move(actor, *action.destination)
+    if action.attack_id is not None:
+        target = snapshot.units[action.target]
+        if target.current_hp > 0:
+            resolve_sim_attack(snapshot, actor, target, snapshot.skills[action.attack_id], rng)
+
+
+def rollout(snapshot, team, rng, horizon):
+    order = snapshot.order
+    for turn in range(horizon):
+        unit = snapshot.units[order[turn % len(order)]]
+        if unit.current_hp <= 0:
+            continue
+        if not snapshot.opponents(unit):
+            break
+        greedy_sim_turn(snapshot, unit, rng)
+    return snapshot.evaluate(team)
+
+
+def search(snapshot, actor_index, actions, budget, seed, horizon, exploration, max_rollouts=None):
+    # UCB1 over the root actions with greedy rollouts below them.
+    # Returns per-action (total reward, visits).
+    rng = random.Random(seed)
+    actor = snapshot.units[actor_index]
+    totals = [0.0] * len(actions)
+    visits = [0] * len(actions)
+    # A rollout cap replaces the time budget, for reproducible searches.
+    deadline = time.perf_counter() + budget if max_rollouts is None else math.inf
+    rollouts = 0
+
+    while rollouts < len(actions) or time.perf_counter() < deadline:
+        if max_rollouts is not None and rollouts >= max_rollouts:
+            break
+        if rollouts < len(actions):
+            choice = rollouts
+        else:
+            log_total = math.log(rollouts)
+            choice = max(
+                range(len(actions)),
+                key=lambda i: totals[i] / visits[i] + exploration * math.sqrt(log_total / visits[i])
+            )
+        sim = snapshot.copy()
+        apply_action(sim, sim.units[actor_index], actions[choice], rng)
+        totals[choice] += rollout(sim, actor.team, rng, horizon)
+        visits[choice] += 1
+        rollouts += 1
+
+    return totals, visits
+
+
+_pool = None
+_pool_workers = 0
+_fork_refused = False
+
+
+def _rollout_pool(workers):
+    # One pool shared by every search. Forking is required: spawned workers
+    # would re-run game.py. Daemonic processes (tournament workers) cannot
+    # have children, so they search in-process. Forking while other threads
+    # run can leave a child stuck on a lock one of them held, so the pool
+    # must be made first (make_planner does); later, search in-process.
+    global _pool, _pool_workers, _fork_refused
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        return None
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    if _pool is None or _pool_workers != workers:
+        if threading.active_count() > 1:
+            if not _fork_refused:
+                tracer.note("ai", "MCTS", "Threads already running; searching in-process instead of forking workers")
+                _fork_refused = True
+            return None
+        shutdown_pool()
+        _pool = multiprocessing.get_context("fork").Pool(workers)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool = None
+        _pool_workers = 0
+
+
+atexit.register(shutdown_pool)
+
+
+class ExpectimaxPlanner:
+    # One ply over every move + skill + target combination. Each action's
+    # dice are a chance node: expected damage (capped at the target's HP)
+    # and kill chance, then the expected retaliation from opponents that
+    # can reach the new tile, where a killed target no longer retaliates.
+    name = "expectimax"
+
+    def reseed(self, rng):
+        pass
+
+    def choose(self, enemy, all_units, attacks_data, reachable, forecast=None, terrain=None):
+        snapshot = Snapshot.capture(all_units, attacks_data, terrain, forecast)
+        actor = next(s for s, u in zip(snapshot.units, all_units) if u is enemy)
+        ranked = self.rank(snapshot, actor, reachable)
+        if not ranked:
+            return None
+        return self.to_plan(ranked[0][1], all_units)
+
+    def to_plan(self, action, all_units):
+        target = all_units[action.target] if action.target is not None else None
+        return Plan(action.destination, action.attack_id, target)
+
+    def actions(self, snapshot, actor, reachable):
+        destinations = [(actor.x, actor.y)] + [tile for tile in reachable if tile != (actor.x, actor.y)]
+        opponents = snapshot.opponents(actor)
+        actions = []
+        for dx, dy in destinations:
+            actions.append(Action((dx, dy), None, None))
+            for attack_id in actor.attack_ids:
+                skill = snapshot.skills.get(attack_id)
+                if not skill:
+                    continue
+                for target in opponents:
+                    if _distance(dx, dy, target.x, target.y) <= skill["range"]:
+                        actions.append(Action((dx, dy), attack_id, target.index))
+        return actions
+
+    def rank(self, snapshot, actor, reachable):
+        opponents = snapshot.opponents(actor)
+        if not opponents:
+            return []
+
+        threats = {}
+        for opp in opponents:
+            reach = MOVE_RANGE + max((snapshot.skills[a]["range"] for a in opp.attack_ids if a in snapshot.skills), default=0)
+            damage = max((
+                attack_odds(opp, actor, snapshot.skills[a], snapshot.skills[a].get("category", "attack")).expected_damage
+                for a in opp.attack_ids if a in snapshot.skills
+            ), default=0.0)
+            threats[opp.index] = (reach, damage)
+
+        scored = []
+        for order, action in enumerate(self.actions(snapshot, actor, reachable)):
+            dx, dy = action.destination
+            value = 0.0
+            kill_chance = 0.0
+            if action.attack_id is not None:
+                target = snapshot.units[action.target]
+                skill = snapshot.skills[action.attack_id]
+                odds = attack_odds(actor, target, skill, skill.get("category", "attack"))
+                kill_chance = odds.kill_chance
+                value += odds.hit_chance * capped_damage(skill["damage"], target.current_hp) + KILL_BONUS * kill_chance
+
+            for opp in opponents:
+                reach, damage = threats[opp.index]
+                if _distance(dx, dy, opp.x, opp.y) <= reach:
+                    survives = 1.0 - kill_chance if opp.index == action.target else 1.0
+                    value -= THREAT_WEIGHT * survives * damage
+
+            value -= APPROACH_WEIGHT * min(_distance(dx, dy, o.x, o.y) for o in opponents)
+            scored.append((value, action, -order))
+
+        scored.sort(key=lambda item: (item[0], item[2]), reverse=True)
+        return [(value, action) for value, action, _ in scored]
+
+
+class MCTSPlanner(ExpectimaxPlanner):
+    # Keeps the expectimax planner's best few actions and plays each out
+    # with greedy rollouts until the turn budget is spent. With workers > 1
+    # every worker searches the same actions for the whole budget with its
+    # own dice, and their statistics are pooled.
+    name = "mcts"
+
+    def __init__(self, budget_ms=150, workers=0, width=8, horizon=12, exploration=0.7, seed=None, max_rollouts=None):
+        self.budget_ms = budget_ms
+        self.workers = workers
+        self.width = width
+        self.horizon = horizon
+        self.exploration = exploration
+        self.max_rollouts = max_rollouts
+        self.rng = random.Random(seed)
+        self.last_rollouts = 0
+        _rollout_pool(workers)  # Start workers now rather than on the first enemy turn.
+
+    def reseed(self, rng):
+        self.rng = rng
+
+    def choose(self, enemy, all_units, attacks_data, reachable, forecast=None, terrain=None):
+        snapshot = Snapshot.capture(all_units, attacks_data, terrain, forecast)
+        actor = next(s for s, u in zip(snapshot.units, all_units) if u is enemy)
+        ranked = self.rank(snapshot, actor, reachable)
+        if not ranked:
+            return None
+        actions = [action for _, action in ranked[:self.width]]
+        if len(actions) == 1:
+            return self.to_plan(actions[0], all_units)
+
+        budget = self.budget_ms / 1000
+        pool = _rollout_pool(self.workers)
+        if pool is None:
+            results = [search(snapshot, actor.index, actions, budget, self.rng.random(), self.horizon,
+                              self.exploration, self.max_rollouts)]
+        else:
+            # Leave a slice of the budget for shipping snapshots back and forth.
+            jobs = [
+                (snapshot, actor.index, actions, budget * 0.8, self.rng.random(), self.horizon,
+                 self.exploration, self.max_rollouts)
+                for _ in range(self.workers)
+            ]
+            results = pool.starmap(search, jobs)
+
+        totals = [sum(r[0][i] for r in results) for i in range(len(actions))]
+        visits = [sum(r[1][i] for r in results) for i in range(len(actions))]
+        self.last_rollouts = sum(visits)
+        best = max(range(len(actions)), key=lambda i: (totals[i] / visits[i] if visits[i] else -math.inf, -i))
+        return self.to_plan(actions[best], all_units)
+
+
+PLANNERS = {
+    "greedy": None,  # The built-in AI in enemy_take_turn; cheapest.
+    "expectimax": ExpectimaxPlanner,
+    "mcts": MCTSPlanner,
+}
+
+
+def make_planner(name="greedy", budget_ms=150, workers=0, seed=None, max_rollouts=None):
+    planner_class = PLANNERS[name]
+    if planner_class is MCTSPlanner:
+        return MCTSPlanner(budget_ms, workers, seed=seed, max_rollouts=max_rollouts)
+    return planner_class() if planner_class else None
@@ -0,0 +1,126 @@
+from concurrent.futures import Future
+import copy
+import threading
+
+from utils.battle import BattleSession
+from utils.battle_log import BattleLog
+from utils.trace import tracer
+
+
+def _position(session):
+    # Enough to tell whether two copies of a battle are at the same point.
+    return session.turns_taken, session.unit_ref(session.active), len(session.actions)
+
+
+def catch_up(mirror, actions):
+    # Replays actions recorded by the real session onto the mirror, with the
+    # same knocked-out turn skips the game loop makes between them.
+    with tracer.muted():
+        for action in actions:
+            while not mirror.done and mirror.active.current_hp <= 0:
+                mirror.step()
+            mirror.replay_action(action)
+        while not mirror.done and mirror.active.current_hp <= 0:
+            mirror.step()
+
+
+class AiTurnRunner:
+    # Works out AI turns on a background thread, so the frame loop keeps
+    # drawing while the AI thinks. The thread keeps its own mirror of the
+    # battle: built once from a snapshot, then brought up to date each turn
+    # by replaying the actions the real session has recorded since, so its
+    # reach and distance-field caches carry over between turns. The mirror
+    # has its own RNG and planner copy; the AI stream it drew from is
+    # written back when the decision is applied on the main thread, so
+    # decisions (and saves taken meanwhile) match session.step().
+    def __init__(self):
+        self.future = None
+        self.cancelled = 0
+        self.rebuilds = 0
+        self._turn = None
+        self._mirror = None
+        self._owner = None
+        self._synced = 0  # len(session.actions) the mirror has replayed
+
+    @property
+    def thinking(self):
+        return self.future is not None
+
+    def start(self, session):
+        mirror = self._mirror if self._owner is session else None
+        if mirror is None:
+            # Only the snapshot is taken here; the mirror is built on the thread.
+            state = session.snapshot()
+            planner = copy.copy(session.planner)
+            actions = ()
+            self.rebuilds += 1
+        else:
+            actions = session.actions[self._synced:]
+        expected = _position(session)
+        planner_teams = session.planner_teams
+        future = Future()
+
+        def work():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                if mirror is None:
+                    built = BattleSession.from_snapshot(state, log=BattleLog(capacity=1), planner=planner,
+                                                        planner_teams=planner_teams)
+                else:
+                    built = mirror
+                    catch_up(built, actions)
+                if _position(built) != expected:
+                    future.set_result((None, None, None))  # Drifted; rebuilt next turn.
+                    return
+                decision = built.decide_ai_turn()
+                future.set_result((built, decision, built.rng.ai.getstate()))
+            except BaseException as e:
+                future.set_exception(e)
+
+        # The mirror belongs to the thread until its answer is applied.
+        self._mirror = None
+        self._owner = session
+        # Daemonic, so quitting never waits on a search that is still running.
+        threading.Thread(target=work, name="ai-turn", daemon=True).start()
+        self.future = future
+        self._turn = (session, session.active, session.turns_taken, expected[2])
+        return future
+
+    def update(self, session):
+        # Call once per frame while the session isn't waiting on the player.
+        # Returns True when the battle moved on this frame.
+        if self.future is None:
+            if session.done or session.awaiting_input():
+                return False
+            if session.active.current_hp <= 0:
+                return session.step()  # KO'd units are skipped on the spot.
+            self.start(session)
+            return False
+
+        if not self.future.done():
+            return False
+        future, (owner, unit, turns, synced) = self.future, self._turn
+        self.future = None
+        self._turn = None
+        mirror, decision, ai_state = future.result()  # Re-raises anything the AI thread hit.
+        if owner is not session or session.active is not unit or session.turns_taken != turns:
+            return False  # The battle moved on without it (e.g. a load).
+        if mirror is None:
+            return False
+        session.rng.ai.setstate(ai_state)
+        self._mirror = mirror
+        self._synced = synced
+        return session.step(decision)
+
+    def cancel(self):
+        # A running search can't be interrupted; its answer (and the mirror
+        # it was using) is dropped.
+        if self.future is None:
+            return False
+        self.future.cancel()
+        self.future = None
+        self._turn = None
+        self._mirror = None
+        self.cancelled += 1
+        return True
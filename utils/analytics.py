@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+from res.dice import compile_expression
+
+
+D20 = np.arange(1, 21)
+
+
+@dataclass
+class AttackOdds:
+    hit_chance: float
+    crit_chance: float
+    expected_damage: float
+    kill_chance: float
+
+
+def _dice_pmf(num_rolls, die_size):
+    # Exponentiation by squaring over convolutions of a single die.
+    single = np.full(die_size, 1.0 / die_size)
+    result = np.ones(1)
+    while num_rolls:
+        if num_rolls & 1:
+            result = np.convolve(result, single)
+        num_rolls >>= 1
+        if num_rolls:
+            single = np.convolve(single, single)
+    return result
+
+
+@lru_cache(maxsize=1024)
+def _expression_pmf(expression):
+    program = compile_expression(expression)
+    offset = program.constant
+    probs = np.ones(1)
+
+    for sign, num_rolls, faces in program.dice:
+        die_size = len(faces)
+        term = _dice_pmf(num_rolls, die_size)
+        if sign > 0:
+            offset += num_rolls
+        else:
+            term = term[::-1]
+            offset -= num_rolls * die_size
+        probs = np.convolve(probs, term)
+
+    probs.setflags(write=False)
+    return offset, probs
+
+
+def expression_pmf(expression):
+    # Returns (offset, probs) where probs[i] is P(total == offset + i).
+    return _expression_pmf(compile_expression(expression).expression)
+
+
+def expression_distribution(expression):
+    offset, probs = expression_pmf(expression)
+    return {offset + i: float(p) for i, p in enumerate(probs) if p > 0}
+
+
+def expected_value(expression):
+    offset, probs = expression_pmf(expression)
+    return float(offset + np.dot(np.arange(len(probs)), probs))
+
+
+def chance_at_least(expression, threshold):
+    offset, probs = expression_pmf(expression)
+    index = max(0, threshold - offset)
+    return float(probs[index:].sum())
+
+
+def attack_odds(attacker, target, skill, skill_type):
+    # Mirrors the branches of utils.game_engine.resolve_attack.
+    if skill_type == "attack":
+        bonus = getattr(attacker, "attack_bonus", 2)
+        hits = (D20 != 1) & ((D20 == 20) | (D20 + bonus >= target.ac))
+        hit_chance = float(hits.mean())
+        crit_chance = 1 / 20
+    elif skill_type == "magic":
+        dc = getattr(attacker, "save_dc", 8)
+        save_bonus = getattr(target, "save_bonus", 0)
+        hit_chance = float((D20 + save_bonus < dc).mean())
+        crit_chance = 0.0
+    else:
+        return AttackOdds(0.0, 0.0, 0.0, 0.0)
+
+    damage = skill["damage"]
+    current_hp = getattr(target, "current_hp", target.hp)
+    return AttackOdds(
+        hit_chance=hit_chance,
+        crit_chance=crit_chance,
+        expected_damage=hit_chance * expected_value(damage),
+        kill_chance=hit_chance * chance_at_least(damage, current_hp)
+    )
+
+
+def odds_table(attackers, targets, skills_data):
+    table = {}
+    for attacker in attackers:
+        for target in targets:
+            if target is attacker:
+                continue
+            for attack_id in attacker.attack_ids:
+                skill = skills_data.get(str(attack_id))
+                if not skill:
+                    continue
+                skill_type = skill.get("category", "attack")
+                table[(attacker.name, target.name, str(attack_id))] = attack_odds(attacker, target, skill, skill_type)
+    return table
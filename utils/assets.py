@@ -0,0 +1,256 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pygame
+
+from res.campaign import CAMPAIGNS_DIR
+from utils.trace import tracer
+
+
+# Base assets live in assets/ and a campaign can override any of them by
+# dropping a file at the same relative path under campaigns/<name>/assets/:
+#   units/<unit name>.png   sprite for one character, e.g. units/goblin_grunt.png
+#   units/<team>.png        sprite for any unit on that team (player, enemy)
+#   tiles/<name>.png        map tiles (tiles/floor.png fills the battle grid)
+#   portraits/, ui/         reserved for character portraits and UI art
+ASSETS_DIR = "assets"
+FLOOR_TILE = "tiles/floor"
+IMAGE_EXTENSIONS = (".png", ".webp", ".jpg", ".bmp")
+ASSET_CACHE_BYTES = 64 * 1024 * 1024
+DECODE_WORKERS = 2
+# Posted when a background load finishes, so a frame loop asleep in
+# pygame.event.wait wakes up and draws the new images.
+ASSETS_READY = pygame.event.custom_type()
+
+
+def asset_slug(name):
+    return name.strip().lower().replace(" ", "_")
+
+
+def unit_asset_names(unit):
+    # Most specific first: the character's own sprite, then its team's.
+    return ("units/" + asset_slug(unit.name), "units/" + asset_slug(unit.team or "neutral"))
+
+
+def _decode(path, size):
+    # Runs on a decode thread: disk read, image decode and scaling only.
+    # convert() needs the display, so that happens on the main thread.
+    surface = pygame.image.load(path)
+    if size is not None and surface.get_size() != size:
+        surface = pygame.transform.smoothscale(surface, size)
+    return surface
+
+
+def _notify_ready(future):
+    if future.cancelled() or not pygame.display.get_init():
+        return
+    try:
+        pygame.event.post(pygame.event.Event(ASSETS_READY))
+    except pygame.error:
+        pass  # The event queue has already been shut down.
+
+
+def _build_atlas(campaign, base_dir, root, size):
+    # Also runs on a decode thread: opens (or packs) the sprite atlas and
+    # resizes every sprite in it to size.
+    from utils.atlas import load_atlas
+    return load_atlas(campaign, base_dir, root).scaled(size)
+
+
+class AssetManager:
+    # Resolves asset names against the campaign's assets with fallback to
+    # the base assets, decodes images on a thread pool and keeps converted
+    # surfaces in an LRU bounded by pixel memory. Returned surfaces are
+    # shared, so callers must only blit them.
+    def __init__(self, campaign=None, base_dir=ASSETS_DIR, root=CAMPAIGNS_DIR,
+                 max_bytes=ASSET_CACHE_BYTES, workers=DECODE_WORKERS):
+        self.base_dir = base_dir
+        self.root = root
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._surfaces = OrderedDict()  # (path, size) -> converted surface
+        self._pending = {}  # (path, size) -> Future of the decoded surface
+        self._failed = set()
+        self._paths = {}
+        self._atlases = {}  # size -> converted SpriteAtlas
+        self._atlas_pending = {}  # size -> Future of the scaled atlas
+        self.campaign = None
+        self.search_dirs = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset")
+        self.set_campaign(campaign)
+
+    def set_campaign(self, campaign):
+        if self.search_dirs is not None and campaign == self.campaign:
+            return
+        self.campaign = campaign
+        self.search_dirs = [self.base_dir]
+        if campaign:
+            self.search_dirs.insert(0, os.path.join(self.root, campaign, ASSETS_DIR))
+        self._paths.clear()
+        for future in self._atlas_pending.values():
+            future.cancel()
+        self._atlas_pending.clear()
+        self._atlases.clear()
+
+    def _submit(self, fn, *args):
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(_notify_ready)
+        return future
+
+    def resolve(self, name):
+        # name is a path relative to an assets directory, with or without an
+        # extension. None when neither the campaign nor the base has it.
+        try:
+            return self._paths[name]
+        except KeyError:
+            pass
+        candidates = [name] if os.path.splitext(name)[1] else [name + ext for ext in IMAGE_EXTENSIONS]
+        path = None
+        for directory in self.search_dirs:
+            for candidate in candidates:
+                full = os.path.join(directory, candidate)
+                if os.path.isfile(full):
+                    path = full
+                    break
+            if path:
+                break
+        self._paths[name] = path
+        return path
+
+    def preload(self, names, size=None):
+        # Queues decodes without waiting; call while a menu is up so the
+        # battle finds its images ready.
+        queued = 0
+        for name in names:
+            path = self.resolve(name)
+            if path is None:
+                continue
+            key = (path, size)
+            if key in self._surfaces or key in self._pending or key in self._failed:
+                continue
+            self._pending[key] = self._submit(_decode, path, size)
+            queued += 1
+        return queued
+
+    def get(self, name, size=None, wait=False):
+        # The converted surface, or None if the asset doesn't exist or (when
+        # not waiting) is still being decoded; a miss queues the decode.
+        path = self.resolve(name)
+        if path is None:
+            return None
+        key = (path, size)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+        if key in self._failed:
+            return None
+
+        future = self._pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = self._pending[key] = self._submit(_decode, path, size)
+        if not wait and not future.done():
+            return None
+        del self._pending[key]
+        try:
+            surface = future.result()
+        except (pygame.error, OSError, ValueError) as e:
+            tracer.note("ui", "ASSETS", f"Could not load {path}: {e}")
+            self._failed.add(key)
+            return None
+        return self._store(key, surface)
+
+    def first(self, names, size=None, wait=False):
+        # The first of names that exists, e.g. a unit's own sprite before
+        # its team's. Falls through to the next name only if one is missing.
+        for name in names:
+            if self.resolve(name) is not None:
+                return self.get(name, size, wait)
+        return None
+
+    def load_atlas(self, size):
+        # Queues the campaign's sprite atlas, resized to size. From then on
+        # sprite() answers from the atlas instead of single images.
+        if size not in self._atlases and size not in self._atlas_pending:
+            self._atlas_pending[size] = self._submit(_build_atlas, self.campaign, self.base_dir, self.root, size)
+
+    def atlas(self, size, wait=False):
+        atlas = self._atlases.get(size)
+        if atlas is not None:
+            return atlas
+        future = self._atlas_pending.get(size)
+        if future is None or (not wait and not future.done()):
+            return None
+        del self._atlas_pending[size]
+        try:
+            atlas = future.result()
+        except (pygame.error, OSError, ValueError) as e:
+            # Single images still work; sprite() falls back to them.
+            tracer.note("ui", "ASSETS", f"Could not build the sprite atlas: {e}")
+            return None
+        if pygame.display.get_surface() is not None:
+            atlas.convert()
+        self._atlases[size] = atlas
+        return atlas
+
+    def sprite(self, names, size, wait=False):
+        # (surface, area) for the first of names that exists, ready to go in
+        # a Surface.blits() batch; None while it is still loading.
+        if size in self._atlases or size in self._atlas_pending:
+            atlas = self.atlas(size, wait)
+            if atlas is None:
+                return None
+            for name in names:
+                region = atlas.region(name)
+                if region is not None:
+                    return region
+            return None
+        surface = self.first(names, size, wait)
+        return None if surface is None else (surface, None)
+
+    def _store(self, key, surface):
+        # Converted once to the display format, so every blit is a plain copy.
+        if pygame.display.get_surface() is not None:
+            if surface.get_flags() & pygame.SRCALPHA or surface.get_colorkey() is not None:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+        self._surfaces[key] = surface
+        self.bytes += surface.get_pitch() * surface.get_height()
+        while self.bytes > self.max_bytes and len(self._surfaces) > 1:
+            _, evicted = self._surfaces.popitem(last=False)
+            self.bytes -= evicted.get_pitch() * evicted.get_height()
+            self.evictions += 1
+        return surface
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._surfaces),
+            "bytes": self.bytes,
+            "pending": len(self._pending),
+            "evictions": self.evictions,
+            "atlas_bytes": sum(atlas.bytes for atlas in self._atlases.values()),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self._surfaces.clear()
+        self._failed.clear()
+        self.bytes = 0
+
+    def close(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        for future in self._atlas_pending.values():
+            future.cancel()
+        self._atlas_pending.clear()
+        self._pool.shutdown(wait=False)
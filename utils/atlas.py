@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import pygame
+
+from res.campaign import CAMPAIGNS_DIR
+from utils.assets import ASSETS_DIR, IMAGE_EXTENSIONS
+from utils.trace import tracer
+
+
+ATLAS_FORMAT = 1
+ATLAS_DIR = ".cache"
+ATLAS_INDEX = "atlas.json"
+ATLAS_MAX_SIZE = 2048
+SPRITE_KINDS = ("units", "tiles")  # Asset folders packed into the atlas.
+
+
+def atlas_dir_for(campaign=None, base_dir=ASSETS_DIR, root=CAMPAIGNS_DIR):
+    # A campaign's atlas holds its own sprites plus every base sprite it
+    # doesn't override; the base atlas is used when no campaign is picked.
+    if campaign:
+        return os.path.join(root, campaign, ATLAS_DIR)
+    return os.path.join(base_dir, ATLAS_DIR)
+
+
+def sprite_sources(campaign=None, base_dir=ASSETS_DIR, root=CAMPAIGNS_DIR):
+    # name (e.g. "units/goblin_grunt") -> image path; campaign files win.
+    directories = [base_dir]
+    if campaign:
+        directories.append(os.path.join(root, campaign, ASSETS_DIR))
+    sources = {}
+    for directory in directories:
+        for kind in SPRITE_KINDS:
+            folder = os.path.join(directory, kind)
+            if not os.path.isdir(folder):
+                continue
+            for filename in sorted(os.listdir(folder)):
+                stem, ext = os.path.splitext(filename)
+                if ext.lower() in IMAGE_EXTENSIONS:
+                    sources[f"{kind}/{stem}"] = os.path.join(folder, filename)
+    return sources
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+def pack(sizes, max_size=ATLAS_MAX_SIZE):
+    # Shelf packing: tallest first, left to right in rows, and a new page
+    # once a page is full. Returns {name: (page, x, y)} and the page sizes.
+    placements = {}
+    pages = []
+    x = y = shelf = width = height = 0
+    for name, (w, h) in sorted(sizes.items(), key=lambda item: (-item[1][1], -item[1][0], item[0])):
+        if w > max_size or h > max_size:
+            raise ValueError(f"{name} is {w}x{h}, larger than the {max_size}px atlas")
+        if x + w > max_size:
+            x, y, shelf = 0, y + shelf, 0
+        if y + h > max_size:
+            pages.append((width, height))
+            x = y = shelf = width = height = 0
+        placements[name] = (len(pages), x, y)
+        x += w
+        shelf = max(shelf, h)
+        width = max(width, x)
+        height = max(height, y + h)
+    if placements:
+        pages.append((width, height))
+    return placements, pages
+
+
+class SpriteAtlas:
+    # Sprites packed onto a few large page surfaces. region() hands out
+    # (page, area) pairs, so a frame's sprites go to the screen as one
+    # Surface.blits() batch of (page, dest, area) items.
+    def __init__(self, pages, regions):
+        self.pages = pages
+        self.regions = regions  # name -> (page index, Rect)
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __contains__(self, name):
+        return name in self.regions
+
+    def region(self, name):
+        entry = self.regions.get(name)
+        if entry is None:
+            return None
+        page, rect = entry
+        return self.pages[page], rect
+
+    @property
+    def bytes(self):
+        return sum(page.get_pitch() * page.get_height() for page in self.pages)
+
+    @classmethod
+    def pack_surfaces(cls, surfaces, max_size=ATLAS_MAX_SIZE):
+        placements, page_sizes = pack({name: s.get_size() for name, s in surfaces.items()}, max_size)
+        pages = [pygame.Surface(size, pygame.SRCALPHA) for size in page_sizes]
+        regions = {}
+        for name, (page, x, y) in placements.items():
+            surface = surfaces[name]
+            pages[page].blit(surface, (x, y))
+            regions[name] = (page, pygame.Rect((x, y), surface.get_size()))
+        return cls(pages, regions)
+
+    def scaled(self, size, max_size=ATLAS_MAX_SIZE):
+        # Every sprite resized to size (e.g. the tile size) and repacked, so
+        # nothing is scaled per frame.
+        surfaces = {
+            name: pygame.transform.smoothscale(self.pages[page].subsurface(rect), size)
+            for name, (page, rect) in self.regions.items()
+        }
+        return SpriteAtlas.pack_surfaces(surfaces, max_size)
+
+    def convert(self):
+        # Once, on the main thread, after the display is up.
+        self.pages = [page.convert_alpha() for page in self.pages]
+        return self
+
+    def save(self, directory, sources):
+        os.makedirs(directory, exist_ok=True)
+        names = []
+        for i, page in enumerate(self.pages):
+            names.append(f"atlas_{i}.png")
+            pygame.image.save(page, os.path.join(directory, names[-1]))
+        index = {
+            "format": ATLAS_FORMAT,
+            "pages": names,
+            "regions": {name: [page, *rect] for name, (page, rect) in sorted(self.regions.items())},
+            "sources": {name: _stamp(path) for name, path in sorted(sources.items())},
+        }
+        index_path = os.path.join(directory, ATLAS_INDEX)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, index_path)
+        return index_path
+
+    @classmethod
+    def open(cls, directory, sources):
+        # The saved atlas, or None when it is missing or any source image
+        # was added, removed or changed since it was built.
+        try:
+            with open(os.path.join(directory, ATLAS_INDEX), encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        recorded = index.get("sources", {})
+        if index.get("format") != ATLAS_FORMAT or sorted(recorded) != sorted(sources):
+            return None
+        try:
+            if any(recorded[name] != _stamp(path) for name, path in sources.items()):
+                return None
+            pages = [pygame.image.load(os.path.join(directory, name)) for name in index["pages"]]
+        except (OSError, pygame.error):
+            return None
+        regions = {name: (page, pygame.Rect(x, y, w, h)) for name, (page, x, y, w, h) in index["regions"].items()}
+        return cls(pages, regions)
+
+
+def build_atlas(campaign=None, base_dir=ASSETS_DIR, root=CAMPAIGNS_DIR):
+    sources = sprite_sources(campaign, base_dir, root)
+    atlas = SpriteAtlas.pack_surfaces({name: pygame.image.load(path) for name, path in sources.items()})
+    return atlas, atlas.save(atlas_dir_for(campaign, base_dir, root), sources)
+
+
+def load_atlas(campaign=None, base_dir=ASSETS_DIR, root=CAMPAIGNS_DIR):
+    # Served from the saved atlas when it is current and rebuilt when not,
+    # like the campaign cache.
+    sources = sprite_sources(campaign, base_dir, root)
+    atlas = SpriteAtlas.open(atlas_dir_for(campaign, base_dir, root), sources)
+    if atlas is not None:
+        return atlas
+    atlas = SpriteAtlas.pack_surfaces({name: pygame.image.load(path) for name, path in sources.items()})
+    if sources:
+        try:
+            atlas.save(atlas_dir_for(campaign, base_dir, root), sources)
+        except (OSError, pygame.error) as e:
+            tracer.note("ui", "ATLAS", f"Could not write sprite atlas for {campaign or 'base assets'}: {e}")
+    return atlas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack campaign sprites into texture atlases.")
+    parser.add_argument("campaigns", nargs="*", help="Campaign names (default: the base assets and every campaign in campaigns/)")
+    args = parser.parse_args(argv)
+
+    campaigns = args.campaigns or [None] + [
+        d for d in sorted(os.listdir(CAMPAIGNS_DIR)) if os.path.isdir(os.path.join(CAMPAIGNS_DIR, d))
+    ]
+    for campaign in campaigns:
+        if not sprite_sources(campaign):
+            print(f"[ATLAS] {campaign or 'base assets'}: no sprites")
+            continue
+        atlas, index_path = build_atlas(campaign)
+        sizes = ", ".join(f"{page.get_width()}x{page.get_height()}" for page in atlas.pages)
+        print(f"[ATLAS] {campaign or 'base assets'} -> {index_path} ({len(atlas)} sprites on {sizes})")
+
+
+if __name__ == "__main__":
+    main()
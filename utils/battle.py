@@ -0,0 +1,450 @@
+from collections import Counter
+
+from res.campaign import CAMPAIGNS_DIR, get_repository
+from res.character import character_from_record, character_to_record
+from res.enemies import carry_out_plan, enemy_take_turn
+from res.planner import Plan
+from utils.battle_log import BattleLog
+from utils.game_engine import (
+    MOVE_RANGE,
+    advance_turn,
+    move_character,
+    resolve_attack,
+    roll_initiative,
+    unit_distance
+)
+from utils.movement import ReachabilityCache, Terrain
+from utils.pathfinding import DistanceFieldCache
+from utils.registry import UnitRegistry
+from utils.rng import BattleRng
+from utils.spatial import OccupancyGrid
+from utils.trace import DEBUG, TurnEvent, tracer
+from utils.turn_order import Timeline
+
+
+GRID_WIDTH = 16
+GRID_HEIGHT = 16
+DEFAULT_ENEMIES = ["Vaelith the Hollow", "Goblin Grunt"]
+
+
+def load_skills(campaign_name, root=CAMPAIGNS_DIR):
+    return get_repository(campaign_name, root).skills
+
+def load_starter_characters(campaign_name, root=CAMPAIGNS_DIR):
+    return get_repository(campaign_name, root).starters()
+
+def place_unit(unit, team, x, y):
+    unit.team = team
+    unit.x = x
+    unit.y = y
+    unit.has_moved = False
+    unit.ready_to_move = False
+    return unit
+
+def load_party(campaign_name, names=None, root=CAMPAIGNS_DIR):
+    repository = get_repository(campaign_name, root)
+    if names is None:
+        names = [c["name"] for c in repository.starters()]
+    return [
+        place_unit(repository.load_character(name), "player", 2 + idx, 2)
+        for idx, name in enumerate(names)
+    ]
+
+def load_enemies(campaign_name, names=DEFAULT_ENEMIES, root=CAMPAIGNS_DIR):
+    repository = get_repository(campaign_name, root)
+    return [
+        place_unit(repository.load_character(name), "enemy", 8 + idx, 8 + idx)
+        for idx, name in enumerate(names)
+    ]
+
+def weapon_skill(unit):
+    weapon = unit.equipment.weapon
+    return {
+        "name": "Weapon Attack",
+        "category": "attack",
+        "target": "enemy",
+        "range": getattr(weapon, "range", 1) if weapon else 1,
+        "damage": getattr(weapon, "atk_roll", "0") if weapon else "0",
+    }
+
+
+class BattleSession:
+    def __init__(self, units, attacks_data, ai_teams=("enemy",), grid_width=GRID_WIDTH, grid_height=GRID_HEIGHT, terrain=None, log=None, planner=None,
+                 planner_teams=None, rng=None):
+        self._setup(units, attacks_data, ai_teams, grid_width, grid_height, terrain, log, planner, planner_teams, rng)
+        self.timeline = Timeline(self.all_units, lambda unit: roll_initiative(unit, self.rng.initiative))
+        self.active = advance_turn(self.timeline)
+        if self.active is None:
+            self.game_over = True
+
+    def _setup(self, units, attacks_data, ai_teams, grid_width, grid_height, terrain, log, planner, planner_teams, rng, roster=None):
+        self.all_units = list(units)
+        self.units_by_ref = list(self.all_units if roster is None else roster)
+        self._refs = {id(u): i for i, u in enumerate(self.units_by_ref)}
+        self.rng = rng if rng is not None else BattleRng()
+        self.seed = self.rng.seed
+        self.setup = {}
+        self.actions = []  # Every player and AI action, in order, for replays.
+        self.attacks_data = attacks_data
+        self._plain_skills = None
+        self._roster = []
+        self.ai_teams = set(ai_teams)
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.grid = OccupancyGrid(self.all_units)
+        self.registry = UnitRegistry(self.all_units)
+        self.terrain = terrain or Terrain(grid_width, grid_height)
+        self.reach = ReachabilityCache(self.terrain, self.grid, MOVE_RANGE)
+        self.paths = DistanceFieldCache(self.terrain)
+        self.planner = planner
+        if planner is not None:
+            planner.reseed(self.rng.ai)
+        self.planner_teams = set(planner_teams) if planner_teams is not None else None
+        self.terrain.adjacency()  # Built once up front rather than on the first enemy turn.
+
+        self.mode = "idle"
+        self.selected_attack = None
+        self.battle_log = log if log is not None else BattleLog()
+        self.victory = False
+        self.game_over = False
+        self.turns_taken = 0
+        self.damage_by_skill = Counter()
+
+    @classmethod
+    def from_campaign(cls, campaign_name, party_names=None, enemy_names=DEFAULT_ENEMIES, root=CAMPAIGNS_DIR, **kwargs):
+        attacks_data = load_skills(campaign_name, root)
+        units = load_party(campaign_name, party_names, root) + load_enemies(campaign_name, enemy_names, root)
+        session = cls(units, attacks_data, **kwargs)
+        session.setup = {"campaign": campaign_name, "party": party_names, "enemies": list(enemy_names)}
+        if root != CAMPAIGNS_DIR:
+            session.setup["root"] = root  # Only campaigns outside campaigns/ record where they live.
+        return session
+
+    def snapshot(self):
+        # The whole battle as plain data, for utils.save. Units are referred
+        # to by unit_ref throughout.
+        ref = self.unit_ref
+        log = self.battle_log
+        if self._plain_skills is None:
+            # Campaign tables can be views over the mmapped campaign cache.
+            self._plain_skills = dict(self.attacks_data)
+        # Stats and equipment don't change mid-battle, so each unit's record
+        # is only built once.
+        for unit in self.units_by_ref[len(self._roster):]:
+            self._roster.append((unit.team, getattr(unit, "speed", None), character_to_record(unit)))
+        return {
+            "static": {
+                "setup": dict(self.setup),
+                "seed": self.seed,
+                "ai_teams": sorted(self.ai_teams),
+                "grid": [self.grid_width, self.grid_height],
+                "terrain": sorted((x, y, cost) for (x, y), cost in self.terrain.costs.items()),
+                "skills": self._plain_skills,
+                "log_capacity": log.capacity,
+            },
+            "roster": list(self._roster),
+            "units": [(u.current_hp, u.x, u.y, u.has_moved, u.ready_to_move) for u in self.units_by_ref],
+            "battle": {
+                "living": [ref(u) for u in self.all_units],
+                "active": ref(self.active),
+                "mode": self.mode,
+                "selected_attack": self.selected_attack,
+                "victory": self.victory,
+                "game_over": self.game_over,
+                "turns_taken": self.turns_taken,
+                "damage_by_skill": dict(self.damage_by_skill),
+            },
+            "timeline": self.timeline.state(ref),
+            "rng": self.rng.getstate(),
+            "log": [text for _, text in log.recent(log.capacity)],
+            "log_count": log.count,
+            "actions": list(self.actions),
+        }
+
+    @classmethod
+    def from_snapshot(cls, state, log=None, planner=None, planner_teams=None):
+        # Rebuilds a battle from snapshot() data alone; campaign files are
+        # not read again.
+        static = state["static"]
+        roster = []
+        for (team, speed, record), (current_hp, x, y, has_moved, ready_to_move) in zip(state["roster"], state["units"]):
+            unit = place_unit(character_from_record(record), team, x, y)
+            unit.current_hp = current_hp
+            unit.has_moved = has_moved
+            unit.ready_to_move = ready_to_move
+            if speed is not None:
+                unit.speed = speed
+            roster.append(unit)
+
+        rng = BattleRng(static["seed"])
+        rng.setstate(state["rng"])
+        width, height = static["grid"]
+        terrain = Terrain(width, height, {(x, y): cost for x, y, cost in static["terrain"]})
+        battle = state["battle"]
+
+        session = cls.__new__(cls)
+        session._setup(
+            [roster[ref] for ref in battle["living"]], static["skills"], static["ai_teams"], width, height, terrain,
+            log, planner, planner_teams, rng, roster
+        )
+        session.setup = dict(static["setup"])
+        session._roster = list(state["roster"])
+        session.actions = [list(action) for action in state["actions"]]
+        session.mode = battle["mode"]
+        session.selected_attack = battle["selected_attack"]
+        session.victory = battle["victory"]
+        session.game_over = battle["game_over"]
+        session.turns_taken = battle["turns_taken"]
+        session.damage_by_skill = Counter(battle["damage_by_skill"])
+        for text in state["log"]:
+            session.battle_log.append(text)
+        session.timeline = Timeline.restore(state["timeline"], session.unit_by_ref)
+        session.active = session.unit_by_ref(battle["active"])
+        return session
+
+    @property
+    def done(self):
+        return self.victory or self.game_over
+
+    @property
+    def outcome(self):
+        if self.victory:
+            return "victory"
+        if self.game_over:
+            return "defeat"
+        return None
+
+    def add_to_log(self, text):
+        return self.battle_log.append(text)
+
+    def is_ai_turn(self):
+        return self.active is not None and self.active.team in self.ai_teams
+
+    def awaiting_input(self):
+        return not self.done and self.active.current_hp > 0 and not self.is_ai_turn()
+
+    def unit_ref(self, unit):
+        # Stable number for a unit: its place in the original line-up.
+        return None if unit is None else self._refs.get(id(unit))
+
+    def unit_by_ref(self, ref):
+        return None if ref is None else self.units_by_ref[ref]
+
+    def get_unit_at(self, x, y):
+        return self.grid.get(x, y)
+
+    def skill_for(self, attack_id):
+        if attack_id == "weapon_attack":
+            return weapon_skill(self.active)
+        return self.attacks_data[str(attack_id)]
+
+    def targets_in_range(self, attack_id):
+        atk_range = self.skill_for(attack_id)["range"]
+        return [
+            u for u in self.grid.in_radius(self.active.x, self.active.y, atk_range)
+            if u.team != self.active.team
+        ]
+
+    def reachable_for(self, unit):
+        return self.reach.get(unit)
+
+    def move_unit(self, character, x, y):
+        moved = move_character(self.all_units, character, x, y, self.grid, self.reachable_for(character))
+        if moved:
+            self.registry.moved(character)
+            self.reach.invalidate()
+            self.paths.unit_moved(character)
+        return moved
+
+    def apply_action(self, action):
+        if self.done:
+            return False
+        kind = action["action"]
+        if kind == "move":
+            self.actions.append(["m", action["x"], action["y"]])
+            return self._apply_move(action["x"], action["y"])
+        if kind == "attack":
+            self.actions.append(["a", action["attack_id"], self.unit_ref(action["target"])])
+            return self._apply_attack(action["attack_id"], action["target"])
+        if kind == "end_turn":
+            self.actions.append(["e"])
+            self.end_turn()
+            return True
+        raise ValueError(f"Unknown action '{kind}'")
+
+    def _apply_move(self, x, y):
+        if self.active.has_moved:
+            return False
+        moved = self.move_unit(self.active, x, y)
+        if moved:
+            self.active.has_moved = True
+            self.mode = "idle"
+        return moved
+
+    def _apply_attack(self, attack_id, target):
+        attacker = self.active
+        if not target or target.team == attacker.team:
+            return None
+
+        if attack_id == "weapon_attack" and not attacker.equipment.weapon:
+            tracer.note("attack", "FAIL", f"{attacker.name} has no weapon.")
+            return None
+
+        skill = self.skill_for(attack_id)
+        if unit_distance(attacker, target) > skill["range"]:
+            tracer.note("attack", "FAIL", "Target out of range for skill.")
+            return None
+
+        combat_result = self._resolve(attacker, target, skill, skill.get("category", "attack"))
+
+        attacker.has_moved = True
+        self.selected_attack = None
+        self.mode = "idle"
+        return combat_result
+
+    def _resolve(self, attacker, target, skill, skill_type):
+        combat_result = resolve_attack(
+            attacker, target, skill, skill_type, self.timeline, self.all_units, self.add_to_log, self.grid, self.registry,
+            self.rng.attack
+        )
+        self.add_to_log("\n".join(combat_result["log"]))
+        if target.current_hp <= 0:
+            self.reach.invalidate()
+            self.paths.unit_removed(target)
+        if combat_result["damage"] > 0:
+            self.damage_by_skill[skill["name"]] += combat_result["damage"]
+        if combat_result["victory"]:
+            self.victory = True
+        elif self.registry.count("player") == 0:
+            self.game_over = True
+        return combat_result
+
+    def end_turn(self):
+        if self.active is not None:
+            self.active.has_moved = False
+            self.active.ready_to_move = False
+        self.mode = "idle"
+        self.selected_attack = None
+        self.turns_taken += 1
+        self.reach.invalidate()
+        self.active = advance_turn(self.timeline)
+        if self.active is None:
+            self.game_over = True
+
+    def add_unit(self, unit, team, x, y, charge=0):
+        # Summoned or reinforcing units join the timeline from now on.
+        place_unit(unit, team, x, y)
+        self._refs[id(unit)] = len(self.units_by_ref)
+        self.units_by_ref.append(unit)
+        self.all_units.append(unit)
+        self.grid.add(unit)
+        self.registry.add(unit)
+        self.timeline.add(unit, charge)
+        self.reach.invalidate()
+        return unit
+
+    def delay_unit(self, unit, charge):
+        return self.timeline.delay(unit, charge)
+
+    def decide_ai_turn(self):
+        # Works out the active AI unit's move and attack without touching
+        # the board, as ["ai", x, y, attack_id, target_ref] (the replay form).
+        unit = self.active
+        planner = self.planner
+        if self.planner_teams is not None and unit.team not in self.planner_teams:
+            planner = None
+        if tracer.enabled("ai", DEBUG):
+            tracer.note("ai", "ENEMY TURN", unit.name, DEBUG)
+
+        destination = [unit.x, unit.y]
+
+        def plan_move(mover, x, y):
+            # The AI moves at most once and as its last look at the board.
+            destination[:] = [x, y]
+            return True
+
+        result = enemy_take_turn(
+            unit,
+            self.all_units,
+            self.attacks_data,
+            plan_move,
+            self.get_unit_at,
+            self.reachable_for,
+            self.paths.toward,
+            self.registry,
+            planner,
+            self.timeline.upcoming(2 * len(self.timeline)) if planner else None,
+            self.terrain
+        )
+
+        attacks = result and result.get("action") not in ("move", "none")
+        return [
+            "ai",
+            destination[0],
+            destination[1],
+            result["attack_id"] if attacks else None,
+            self.unit_ref(result["target"]) if attacks else None
+        ]
+
+    def take_ai_turn(self, decision=None):
+        # Carries out a decision from decide_ai_turn, made now if not given.
+        if decision is None:
+            decision = self.decide_ai_turn()
+        unit = self.active
+        _, x, y, attack_id, target_ref = decision
+        result = carry_out_plan(unit, Plan((x, y), attack_id, self.unit_by_ref(target_ref)), self.attacks_data, self.move_unit)
+
+        attacks = result.get("action") not in ("move", "none")
+        self.actions.append([
+            "ai",
+            unit.x,
+            unit.y,
+            attack_id if attacks else None,
+            target_ref if attacks else None
+        ])
+        if attacks:
+            skill = self.attacks_data[str(attack_id)]
+            self._resolve(result["attacker"], result["target"], skill, result["type"])
+        return result
+
+    def replay_action(self, action):
+        # Applies one entry of self.actions (player or AI) as it was recorded.
+        kind = action[0]
+        if kind == "ai":
+            return self.step(action)
+        if kind == "m":
+            return self.apply_action({"action": "move", "x": action[1], "y": action[2]})
+        if kind == "a":
+            return self.apply_action({"action": "attack", "attack_id": action[1], "target": self.unit_by_ref(action[2])})
+        if kind == "e":
+            return self.apply_action({"action": "end_turn"})
+        raise ValueError(f"Unknown recorded action '{kind}'")
+
+    def step(self, decision=None):
+        # Advances the battle by one turn if no player input is needed. An
+        # AI decision worked out elsewhere (see utils.ai_turns) can be passed in.
+        if self.done:
+            return False
+
+        if self.active.current_hp <= 0:
+            if tracer.enabled("turn"):
+                tracer.emit(TurnEvent(self.active.name, skipped=True))
+            self.timeline.remove(self.active)
+            self.active = advance_turn(self.timeline)
+            if self.active is None:
+                self.game_over = True
+            return True
+
+        if not self.is_ai_turn():
+            return False
+
+        self.take_ai_turn(decision)
+        if not self.done:
+            self.end_turn()
+        return True
+
+    def run_until_done(self, max_turns=1000):
+        while not self.done and self.turns_taken < max_turns:
+            if not self.step():
+                break
+        return self.outcome
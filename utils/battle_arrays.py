@@ -0,0 +1,183 @@
+import numpy as np
+from res.dice import compile_expression
+
+
+MOVED = 1
+READY_TO_MOVE = 2
+DEFAULT_TEAMS = ("player", "enemy")
+
+
+def roll_array(expression, count, rng=None):
+    # count totals of a dice expression as one vectorized draw.
+    rng = rng or np.random.default_rng()
+    program = compile_expression(expression)
+    totals = np.full(count, program.constant, dtype=np.int32)
+    for sign, num_rolls, faces in program.dice:
+        rolls = rng.integers(faces.start, faces.stop, size=(count, num_rolls), dtype=np.int32)
+        totals += sign * rolls.sum(axis=1, dtype=np.int32)
+    return totals
+
+
+class BattleArrays:
+    # Struct-of-arrays battle state: one row per unit, one contiguous
+    # array per field. Rows are never reordered, so a row index is a
+    # stable unit handle; KO'd units stay in place with hp == 0.
+    FIELDS = (
+        ("hp", np.int32),
+        ("max_hp", np.int32),
+        ("ac", np.int16),
+        ("x", np.int16),
+        ("y", np.int16),
+        ("team", np.int8),
+        ("initiative", np.int16),
+        ("flags", np.uint8),
+    )
+
+    def __init__(self, capacity=64, teams=DEFAULT_TEAMS):
+        self.count = 0
+        self.names = []
+        self.teams = list(teams)
+        self.team_index = {team: i for i, team in enumerate(self.teams)}
+        self._capacity = max(1, capacity)
+        self._data = {name: np.zeros(self._capacity, dtype) for name, dtype in self.FIELDS}
+
+    @classmethod
+    def from_units(cls, units, teams=None):
+        units = list(units)
+        if teams is None:
+            teams = list(DEFAULT_TEAMS)
+            teams += sorted({u.team for u in units} - set(teams))
+        arrays = cls(len(units), teams)
+        for unit in units:
+            arrays.add_unit(unit)
+        return arrays
+
+    def __getattr__(self, name):
+        # Field access returns a view of the live rows, e.g. arrays.hp.
+        data = self.__dict__.get("_data")
+        if data is not None and name in data:
+            return data[name][:self.count]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._data.values())
+
+    def _grow(self, needed):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        for name, array in self._data.items():
+            grown = np.zeros(capacity, array.dtype)
+            grown[:self.count] = array[:self.count]
+            self._data[name] = grown
+        self._capacity = capacity
+
+    def _team_code(self, team):
+        code = self.team_index.get(team)
+        if code is None:
+            code = len(self.teams)
+            self.teams.append(team)
+            self.team_index[team] = code
+        return code
+
+    def add(self, name, hp, ac, x, y, team, initiative=0, max_hp=None, flags=0):
+        if self.count == self._capacity:
+            self._grow(self.count + 1)
+        i = self.count
+        data = self._data
+        data["hp"][i] = hp
+        data["max_hp"][i] = hp if max_hp is None else max_hp
+        data["ac"][i] = ac
+        data["x"][i] = x
+        data["y"][i] = y
+        data["team"][i] = self._team_code(team)
+        data["initiative"][i] = initiative
+        data["flags"][i] = flags
+        self.names.append(name)
+        self.count += 1
+        return i
+
+    def add_unit(self, unit):
+        flags = (MOVED if getattr(unit, "has_moved", False) else 0) | (READY_TO_MOVE if getattr(unit, "ready_to_move", False) else 0)
+        return self.add(unit.name, unit.current_hp, unit.ac, unit.x, unit.y, unit.team, unit.initiative, unit.hp, flags)
+
+    def write_back(self, units):
+        # Copies mutable state onto the Character objects the rows came
+        # from; units must be in row order, as passed to from_units.
+        hp, x, y, flags = self.hp.tolist(), self.x.tolist(), self.y.tolist(), self.flags.tolist()
+        for i, unit in enumerate(units):
+            unit.current_hp = hp[i]
+            unit.x = x[i]
+            unit.y = y[i]
+            unit.has_moved = bool(flags[i] & MOVED)
+            unit.ready_to_move = bool(flags[i] & READY_TO_MOVE)
+        return units
+
+    def living(self):
+        return self.hp > 0
+
+    def living_counts(self):
+        counts = np.bincount(self.team[self.living()], minlength=len(self.teams))
+        return {team: int(counts[code]) for team, code in self.team_index.items()}
+
+    def in_range(self, x, y, radius, team=None, exclude_team=None, living=True):
+        # Row indices within Euclidean radius of (x, y), as unit_distance measures.
+        dx = self.x.astype(np.int32) - x
+        dy = self.y.astype(np.int32) - y
+        mask = dx * dx + dy * dy <= radius * radius
+        if living:
+            mask &= self.living()
+        if team is not None:
+            mask &= self.team == self.team_index.get(team, -1)
+        if exclude_team is not None:
+            mask &= self.team != self.team_index.get(exclude_team, -1)
+        return np.flatnonzero(mask)
+
+    def nearest_opponents(self, rows, chunk=256):
+        # For each row, the closest living row on another team (-1 if none).
+        # Rows go in chunks so the distance matrix stays small.
+        rows = np.asarray(rows, dtype=np.intp)
+        nearest = np.full(len(rows), -1, dtype=np.intp)
+        living = np.flatnonzero(self.living())
+        if not len(living):
+            return nearest
+        lx = self.x[living].astype(np.int32)
+        ly = self.y[living].astype(np.int32)
+        lteam = self.team[living]
+
+        for start in range(0, len(rows), chunk):
+            part = rows[start:start + chunk]
+            dx = lx[None, :] - self.x[part][:, None]
+            dy = ly[None, :] - self.y[part][:, None]
+            dist = (dx * dx + dy * dy).astype(np.float64)
+            dist[lteam[None, :] == self.team[part][:, None]] = np.inf
+            best = dist.argmin(axis=1)
+            found = np.isfinite(dist[np.arange(len(part)), best])
+            nearest[start:start + chunk] = np.where(found, living[best], -1)
+        return nearest
+
+    def apply_damage(self, rows, amounts):
+        # Hits on the same row stack. Returns the rows knocked out by this call.
+        rows = np.asarray(rows, dtype=np.intp)
+        total = np.zeros(self.count, dtype=np.int64)
+        np.add.at(total, rows, amounts)
+        hp = self.hp
+        was_up = hp > 0
+        hp -= np.minimum(hp, total).astype(hp.dtype)
+        return np.flatnonzero(was_up & (hp == 0))
+
+    def resolve_attacks(self, attackers, targets, damage, bonus=2, rng=None):
+        # Vectorized attack-branch of resolve_attack: natural 1 misses,
+        # natural 20 hits, otherwise d20 + bonus against the target's AC.
+        rng = rng or np.random.default_rng()
+        attackers = np.asarray(attackers, dtype=np.intp)
+        targets = np.asarray(targets, dtype=np.intp)
+        rolls = rng.integers(1, 21, size=len(targets))
+        hits = (rolls != 1) & ((rolls == 20) | (rolls + bonus >= self.ac[targets]))
+        hits &= self.hp[attackers] > 0
+        amounts = np.maximum(roll_array(damage, int(hits.sum()), rng), 0)
+        return hits, self.apply_damage(targets[hits], amounts)
@@ -0,0 +1,84 @@
+from array import array
+import json
+import os
+
+
+LOG_CAPACITY = 256
+LOGS_DIR = "logs"
+
+
+class BattleLog:
+    # The newest entries live in a fixed-size ring; when a history path is
+    # given every entry is also appended there as a JSON line, with an index
+    # of byte offsets, so older entries can be read back for scrollback.
+    # Entries are numbered from 0 in the order they were added.
+    def __init__(self, capacity=LOG_CAPACITY, history_path=None):
+        self.capacity = capacity
+        self._ring = [None] * capacity
+        self.count = 0
+
+        self.history_path = history_path
+        self._history = None
+        self._offsets = array("Q")
+        if history_path:
+            directory = os.path.dirname(history_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._history = open(history_path, "w+b")
+
+    def append(self, text):
+        seq = self.count
+        self._ring[seq % self.capacity] = text
+        self.count += 1
+        if self._history is not None:
+            self._history.seek(0, os.SEEK_END)
+            self._offsets.append(self._history.tell())
+            self._history.write(json.dumps(text).encode("utf-8") + b"\n")
+        return seq
+
+    @property
+    def first_available(self):
+        if self._history is not None:
+            return 0
+        return max(0, self.count - self.capacity)
+
+    def entry(self, seq):
+        if not self.first_available <= seq < self.count:
+            raise IndexError(seq)
+        if seq >= self.count - self.capacity:
+            return self._ring[seq % self.capacity]
+
+        history = self._history
+        history.flush()
+        history.seek(self._offsets[seq])
+        return json.loads(history.readline())
+
+    def recent(self, n, end=None):
+        # Up to n (seq, text) pairs ending before end, oldest first.
+        end = self.count if end is None else min(end, self.count)
+        start = max(self.first_available, end - n)
+        return [(seq, self.entry(seq)) for seq in range(start, end)]
+
+    def clear(self):
+        self._ring = [None] * self.capacity
+        self.count = 0
+        self._offsets = array("Q")
+        if self._history is not None:
+            self._history.seek(0)
+            self._history.truncate()
+
+    def close(self):
+        if self._history is not None:
+            self._history.close()
+            self._history = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for seq in range(max(0, self.count - self.capacity), self.count):
+            yield self._ring[seq % self.capacity]
+
+
+def history_path_for(name, directory=LOGS_DIR):
+    return os.path.join(directory, f"{name}.jsonl")
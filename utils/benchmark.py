@@ -0,0 +1,395 @@
+from collections import namedtuple
+import argparse
+import atexit
+import gc
+import glob
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from res.campaign import CampaignRepository, get_repository
+from res.character import load_character_by_name
+from res.dice import evaluate_expression, roll_die
+from res.enemies import enemy_take_turn, get_closest_enemy, move_towards
+from utils.battle import BattleSession, load_enemies, load_party, place_unit, weapon_skill
+from utils.battle_log import BattleLog
+from utils.game_engine import get_character_at, resolve_attack
+from utils.rng import BattleRng
+from utils.trace import tracer
+
+
+BENCHMARK_VERSION = 1
+CAMPAIGN = "Elarion"
+TILE_SIZE = 40
+DEFAULT_SIZES = {"units": [8, 64, 256], "grid": [16, 64], "log": [64, 4096]}
+REGRESSION_THRESHOLD = 1.25  # Flag cases this many times slower than the baseline.
+
+Case = namedtuple("Case", "name axes setup")
+CASES = []
+
+
+def case(name, *axes):
+    # Registers a benchmark. setup(params) builds the scenario and returns
+    # the operation to time; params holds one value per axis.
+    def register(setup):
+        CASES.append(Case(name, axes, setup))
+        return setup
+    return register
+
+
+def make_units(count, grid, seed=0):
+    # count campaign characters on distinct random tiles, alternating teams.
+    repository = get_repository(CAMPAIGN)
+    names = [c["name"] for c in repository.characters]
+    rng = random.Random(seed)
+    tiles = rng.sample(range(grid * grid), count)
+    units = []
+    for i, tile in enumerate(tiles):
+        unit = repository.load_character(names[i % len(names)])
+        units.append(place_unit(unit, "player" if i % 2 == 0 else "enemy", tile % grid, tile // grid))
+    return units
+
+
+def make_session(units, grid, seed=0):
+    return BattleSession(
+        units, get_repository(CAMPAIGN).skills, ai_teams=("enemy", "player"),
+        grid_width=grid, grid_height=grid, rng=BattleRng(seed)
+    )
+
+
+def _screen(width, height):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    pygame.display.init()
+    pygame.font.init()
+    return pygame.display.set_mode((width, height))
+
+
+@case("dice.evaluate_expression")
+def _evaluate_expression(params):
+    rng = random.Random(0)
+    return lambda: evaluate_expression("2d6+3", rng)
+
+
+@case("dice.roll_die")
+def _roll_die(params):
+    rng = random.Random(0)
+    return lambda: roll_die(1, 20, rng)
+
+
+@case("engine.get_character_at", "units", "grid")
+def _get_character_at(params):
+    units = make_units(params["units"], params["grid"])
+    grid = params["grid"]
+    # The far corner is usually empty, so the scan goes through every unit.
+    return lambda: get_character_at(units, grid - 1, grid - 1)
+
+
+@case("engine.get_character_at.grid", "units", "grid")
+def _get_character_at_grid(params):
+    session = make_session(make_units(params["units"], params["grid"]), params["grid"])
+    grid = params["grid"]
+    return lambda: get_character_at(session.all_units, grid - 1, grid - 1, session.grid)
+
+
+@case("engine.resolve_attack", "units")
+def _resolve_attack(params):
+    session = make_session(make_units(params["units"], 32), 32)
+    attacker = session.all_units[0]
+    target = get_closest_enemy(attacker, session.all_units, session.registry)
+    skill = weapon_skill(attacker)
+    rng = random.Random(0)
+    log = lambda text: None
+
+    def op():
+        target.current_hp = 10 ** 6  # Never knocked out, so every call does the same work.
+        resolve_attack(attacker, target, skill, "attack", session.timeline, session.all_units, log,
+                       session.grid, session.registry, rng)
+    return op
+
+
+@case("enemy.take_turn", "units", "grid")
+def _enemy_take_turn(params):
+    session = make_session(make_units(params["units"], params["grid"]), params["grid"])
+    enemy = next(u for u in session.all_units if u.team == "enemy")
+    stay = lambda unit, x, y: True  # Decide, but leave the board as it was.
+
+    def op():
+        session.reach.invalidate()
+        enemy_take_turn(enemy, session.all_units, session.attacks_data, stay, session.get_unit_at,
+                        session.reachable_for, session.paths.toward, session.registry, terrain=session.terrain)
+    return op
+
+
+@case("enemy.move_towards", "units", "grid")
+def _move_towards(params):
+    session = make_session(make_units(params["units"], params["grid"]), params["grid"])
+    enemy = next(u for u in session.all_units if u.team == "enemy")
+    target = get_closest_enemy(enemy, session.all_units, session.registry)
+    stay = lambda unit, x, y: True
+
+    def op():
+        session.reach.invalidate()
+        move_towards(enemy, target, stay, session.get_unit_at, session.reachable_for(enemy), session.paths.toward(target, enemy))
+    return op
+
+
+@case("battle.ai_vs_ai", "units", "grid")
+def _ai_vs_ai(params):
+    seeds = itertools.count()
+
+    def op():
+        seed = next(seeds)
+        session = make_session(make_units(params["units"], params["grid"], seed), params["grid"], seed)
+        session.run_until_done(max_turns=200)
+    return op
+
+
+@case("campaign.load_character_by_name")
+def _load_character_by_name(params):
+    name = get_repository(CAMPAIGN).characters[0]["name"]
+    return lambda: load_character_by_name(name, CAMPAIGN)
+
+
+@case("campaign.load_party")
+def _load_party(params):
+    return lambda: (load_party(CAMPAIGN), load_enemies(CAMPAIGN))
+
+
+@case("campaign.open")
+def _open_campaign(params):
+    # Repository construction, served from the binary campaign cache.
+    return lambda: CampaignRepository(CAMPAIGN).close()
+
+
+@case("campaign.parse_json")
+def _parse_json(params):
+    # The cold path the cache replaces: parsing every campaign file.
+    path = os.path.join("campaigns", CAMPAIGN)
+    files = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".json")]
+
+    def op():
+        for filename in files:
+            with open(filename, "rb") as f:
+                json.loads(f.read())
+    return op
+
+
+@case("draw.grid", "grid")
+def _draw_grid(params):
+    from utils.draw import draw_grid
+    size = params["grid"] * TILE_SIZE
+    screen = _screen(size, size)
+    return lambda: draw_grid(screen, size, size, TILE_SIZE)
+
+
+@case("draw.units", "units", "grid")
+def _draw_units(params):
+    from utils.draw import draw_units
+    from utils.text import get_font
+    size = params["grid"] * TILE_SIZE
+    screen = _screen(size, size)
+    font = get_font(None, 24)
+    units = make_units(params["units"], params["grid"])
+    return lambda: draw_units(screen, font, units, units[0], TILE_SIZE)
+
+
+@case("draw.sprites", "units", "grid")
+def _draw_sprites(params):
+    # Units with art: one sprite per character, packed into an atlas and
+    # drawn as a single blits() batch.
+    import pygame
+    from utils.atlas import SpriteAtlas
+    from utils.draw import draw_units
+    from utils.text import get_font
+    size = params["grid"] * TILE_SIZE
+    screen = _screen(size, size)
+    font = get_font(None, 24)
+    units = make_units(params["units"], params["grid"])
+    sprites = {}
+    for i, name in enumerate(sorted({u.name for u in units})):
+        sprite = pygame.Surface((64, 64), pygame.SRCALPHA)
+        sprite.fill((40 * i % 256, 80, 160, 255))
+        sprites[name] = sprite
+    atlas = SpriteAtlas.pack_surfaces(sprites).scaled((TILE_SIZE, TILE_SIZE)).convert()
+    return lambda: draw_units(screen, font, units, units[0], TILE_SIZE, lambda c: atlas.region(c.name))
+
+
+@case("draw.battle_log", "log")
+def _draw_battle_log(params):
+    from utils.draw import BattleLogView, battle_log_rect
+    from utils.text import get_font
+    screen = _screen(640, 640)
+    history = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False)
+    history.close()
+    log = BattleLog(history_path=history.name)
+    atexit.register(lambda: (log.close(), os.remove(history.name)))
+    for i in range(params["log"]):
+        log.append(f"Entry {i}: Goblin Grunt hits Liora Virelle\nDamage Roll: 1d6+2 -> {i % 8}")
+    view = BattleLogView(get_font(None, 16), battle_log_rect(640, 640))
+    counter = itertools.count(params["log"])
+
+    def op():
+        # A new entry each frame, as during a battle.
+        log.append(f"Entry {next(counter)}: Goblin Grunt misses")
+        view.draw(screen, log)
+    return op
+
+
+def replay_case(path):
+    from utils.replay import Replay
+
+    def setup(params):
+        replay = Replay.load(path)
+        return lambda: replay.start().run()
+    return Case(f"replay.{os.path.splitext(os.path.basename(path))[0]}", (), setup)
+
+
+def _time_batch(op, loops):
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(loops):
+            op()
+        return time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(op, repeat=5, min_time=0.05):
+    # Like timeit: grow the loop count until one batch takes min_time, then
+    # time repeat batches. Times are per call.
+    loops = 1
+    while True:
+        elapsed = _time_batch(op, loops)
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.2))
+    times = [elapsed / loops] + [_time_batch(op, loops) / loops for _ in range(repeat - 1)]
+    return {"min": min(times), "median": statistics.median(times), "loops": loops, "repeat": repeat}
+
+
+def case_key(name, params):
+    if not params:
+        return name
+    return f"{name}[{','.join(f'{axis}={value}' for axis, value in params.items())}]"
+
+
+def expand(cases, sizes):
+    # Every combination of sizes for the axes each case uses.
+    for bench in cases:
+        for values in itertools.product(*(sizes[axis] for axis in bench.axes)):
+            params = dict(zip(bench.axes, values))
+            if "units" in params and "grid" in params and params["units"] > params["grid"] ** 2 // 2:
+                continue
+            yield case_key(bench.name, params), bench, params
+
+
+def run(cases, sizes, repeat=5, min_time=0.05, on_result=None):
+    results = {}
+    for key, bench, params in expand(cases, sizes):
+        results[key] = measure(bench.setup(params), repeat, min_time)
+        if on_result:
+            on_result(key, results[key])
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # (key, ratio) for every case in both runs; ratio > threshold is a regression.
+    ratios = {}
+    for key, result in results.items():
+        base = baseline.get("results", {}).get(key)
+        if base and base["min"] > 0:
+            ratios[key] = result["min"] / base["min"]
+    regressions = [key for key, ratio in ratios.items() if ratio > threshold]
+    return ratios, regressions
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def _sizes(text):
+    return [int(v) for v in text.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time engine, AI, campaign-loading and drawing hot paths.")
+    parser.add_argument("--filter", action="append", help="Only run cases whose name contains this (repeatable)")
+    parser.add_argument("--units", type=_sizes, default=DEFAULT_SIZES["units"], help="Unit counts, e.g. 8,64,256")
+    parser.add_argument("--grid", type=_sizes, default=DEFAULT_SIZES["grid"], help="Grid sizes (tiles per side)")
+    parser.add_argument("--log", type=_sizes, default=DEFAULT_SIZES["log"], help="Battle log lengths")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed batches per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per batch")
+    parser.add_argument("--replays", help="Also fast-forward every replay in this directory")
+    parser.add_argument("--output", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Slowdown ratio that counts as a regression")
+    parser.add_argument("--list", action="store_true", help="List cases and exit")
+    args = parser.parse_args(argv)
+
+    cases = list(CASES)
+    if args.replays:
+        cases += [replay_case(path) for path in sorted(glob.glob(os.path.join(args.replays, "*.replay")))]
+    if args.filter:
+        cases = [c for c in cases if any(f in c.name for f in args.filter)]
+    sizes = {"units": args.units, "grid": args.grid, "log": args.log}
+
+    if args.list:
+        for key, _, _ in expand(cases, sizes):
+            print(key)
+        return 0
+
+    tracer.disable()
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    def report(key, result):
+        line = f"[BENCH] {key:<48} {_format_time(result['min']):>10}  (median {_format_time(result['median'])})"
+        base = baseline and baseline.get("results", {}).get(key)
+        if base:
+            ratio = result["min"] / base["min"]
+            line += f"  x{ratio:.2f}" + ("  REGRESSION" if ratio > args.threshold else "")
+        print(line, flush=True)
+
+    results = run(cases, sizes, args.repeat, args.min_time, report)
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": BENCHMARK_VERSION,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "sizes": sizes,
+                "results": results,
+            }, f, indent=2)
+        print(f"[BENCH] Wrote {len(results)} results to {args.output}")
+
+    if baseline is not None:
+        _, regressions = compare(results, baseline, args.threshold)
+        print(f"[BENCH] {len(regressions)} regression(s) over x{args.threshold:.2f} against {args.compare}")
+        for key in regressions:
+            print(f"[BENCH]   {key}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
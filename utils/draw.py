@@ -1,8 +1,11 @@
+from collections import OrderedDict
 import pygame
-import math
 import sys
 import os
 
+from utils.scheduler import FrameScheduler, needs_redraw
+from utils.text import get_font, render_text
+
 
 WHITE = (255, 255, 255)
 GRAY = (200, 200, 200)
@@ -12,90 +15,189 @@ YELLOW = (255, 255, 0)
 BLACK = (0, 0, 0)
 GREEN = (0, 255, 0)
 
+_tile_surfaces = {}
+
 def draw_grid(screen, screen_width, screen_height, tile_size):
     for x in range(0, screen_width, tile_size):
         pygame.draw.line(screen, GRAY, (x, 0), (x, screen_height))
     for y in range(0, screen_height, tile_size):
         pygame.draw.line(screen, GRAY, (0, y), (screen_width, y))
 
-def draw_battle_log(screen, log_font, battle_log, screen_width, screen_height):
+def build_background(screen_width, screen_height, tile_size, floor=None):
+    # floor is a (surface, area) sprite region tiled across the grid.
+    background = pygame.Surface((screen_width, screen_height))
+    background.fill(WHITE)
+    if floor is not None:
+        source, area = floor
+        background.blits([
+            (source, (x, y), area)
+            for y in range(0, screen_height, tile_size)
+            for x in range(0, screen_width, tile_size)
+        ], False)
+    draw_grid(background, screen_width, screen_height, tile_size)
+    return background
+
+def battle_log_rect(screen_width, screen_height):
     log_width = 165
     log_height = 170
-    x = screen_width - log_width - 10
-    y = screen_height - log_height - 10
-
-    log_surface = pygame.Surface((log_width, log_height), pygame.SRCALPHA)
-    log_surface.fill((200, 200, 200, 180))
-    screen.blit(log_surface, (x, y))
-
-    line_y = y + 5
-    inner_line_spacing = 9
-    between_entries_spacing = 6
-    total_used = 0
-
-    for entry in battle_log:
-        lines = entry.split("\n")
-        block_height = len(lines) * inner_line_spacing + between_entries_spacing
-        if total_used + block_height > log_height:
-            break
+    return pygame.Rect(screen_width - log_width - 10, screen_height - log_height - 10, log_width, log_height)
+
+LOG_PANEL_COLOR = (200, 200, 200, 180)
+LOG_LINE_SPACING = 9
+LOG_ENTRY_SPACING = 6
+
+class BattleLogView:
+    # Each entry is rasterized once into its own surface; scrolling and new
+    # entries only re-blit cached surfaces. scroll counts entries back from
+    # the newest one.
+    def __init__(self, font, rect, cache_size=128):
+        self.font = font
+        self.rect = rect
+        self.cache_size = cache_size
+        self.scroll = 0
+        self._seen = 0
+        self._surfaces = OrderedDict()
+
+    def entry_surface(self, seq, text):
+        surface = self._surfaces.get(seq)
+        if surface is not None:
+            self._surfaces.move_to_end(seq)
+            return surface
+
+        lines = text.split("\n")
+        height = (len(lines) - 1) * LOG_LINE_SPACING + self.font.get_linesize()
+        surface = pygame.Surface((self.rect.width - 3, height), pygame.SRCALPHA)
         for i, line in enumerate(lines):
-            text = log_font.render(line, True, BLACK)
-            screen.blit(text, (x + 3, line_y + total_used + i * inner_line_spacing))
-        total_used += block_height
-
-def highlight_movement_tiles(screen, character, grid_width, grid_height, move_range, tile_size):
-    for dx in range(-move_range, move_range + 1):
-        for dy in range(-move_range, move_range + 1):
-            distance = math.sqrt(dx**2 + dy**2)
-            if distance <= move_range:
-                tx = character.x + dx
-                ty = character.y + dy
-                if 0 <= tx < grid_width and 0 <= ty < grid_height:
-                    pygame.draw.rect(screen, YELLOW, (tx * tile_size, ty * tile_size, tile_size, tile_size), 2)
-
-def draw_ui_buttons(screen, font, screen_height, mode):
-    action_buttons = {}
-    action_types = ["attack", "magic", "item"]
-    for i, action_type in enumerate(action_types):
-        btn = pygame.Rect(10 + (110 * i), screen_height - 180, 100, 40)
-        color = YELLOW if mode == action_type else GRAY
-        pygame.draw.rect(screen, color, btn)
-        label = font.render(action_type.capitalize(), True, BLACK)
-        screen.blit(label, (btn.x + 10, btn.y + 10))
-        action_buttons[action_type] = btn
-
+            surface.blit(self.font.render(line, True, BLACK), (0, i * LOG_LINE_SPACING))
+
+        self._surfaces[seq] = surface
+        if len(self._surfaces) > self.cache_size:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def sync(self, battle_log):
+        # Keeps a scrolled-back view on the same entries as new ones arrive.
+        if self.scroll and battle_log.count > self._seen:
+            self.scroll += battle_log.count - self._seen
+        self._seen = battle_log.count
+        self.scroll = min(self.scroll, max(0, battle_log.count - battle_log.first_available - 1))
+        return (battle_log.count, self.scroll)
+
+    def scroll_by(self, battle_log, entries):
+        self.scroll = max(0, self.scroll + entries)
+        self.sync(battle_log)
+
+    def visible(self, battle_log):
+        # Newest entries that fit the panel, returned oldest first.
+        end = battle_log.count - self.scroll
+        room = self.rect.height - 5
+        blocks = []
+        seq = end - 1
+        while seq >= battle_log.first_available:
+            text = battle_log.entry(seq)
+            block_height = (text.count("\n") + 1) * LOG_LINE_SPACING + LOG_ENTRY_SPACING
+            if block_height > room:
+                break
+            room -= block_height
+            blocks.append((self.entry_surface(seq, text), block_height))
+            seq -= 1
+        blocks.reverse()
+        return blocks
+
+    def draw(self, screen, battle_log):
+        panel = self.rect
+        if screen.get_flags() & pygame.SRCALPHA:
+            # Layer surfaces keep the panel's alpha for compositing.
+            screen.fill(LOG_PANEL_COLOR, panel)
+        else:
+            log_surface = pygame.Surface(panel.size, pygame.SRCALPHA)
+            log_surface.fill(LOG_PANEL_COLOR)
+            screen.blit(log_surface, panel.topleft)
+
+        clip = screen.get_clip()
+        screen.set_clip(panel.clip(clip))
+        line_y = panel.y + 5
+        for surface, block_height in self.visible(battle_log):
+            screen.blit(surface, (panel.x + 3, line_y))
+            line_y += block_height
+        screen.set_clip(clip)
+
+HUD_COLOR = (0, 0, 0, 170)
+
+def profiler_hud_rect(font, lines, x=5, y=5):
+    width = max(font.size(line)[0] for line in lines) + 10
+    return pygame.Rect(x, y, width, len(lines) * font.get_linesize() + 6)
+
+def draw_profiler_hud(screen, font, rect, lines):
+    panel = pygame.Surface(rect.size, pygame.SRCALPHA)
+    panel.fill(HUD_COLOR)
+    screen.blit(panel, rect)
+    for i, line in enumerate(lines):
+        # Numbers change every refresh, so skip the text cache.
+        screen.blit(font.render(line, True, WHITE), (rect.x + 5, rect.y + 3 + i * font.get_linesize()))
+
+def tile_rect(tx, ty, tile_size):
+    return pygame.Rect(tx * tile_size, ty * tile_size, tile_size, tile_size)
+
+def draw_tile_highlight(screen, rect, color=YELLOW, width=2):
+    pygame.draw.rect(screen, color, rect, width)
+
+def ui_button_layout(screen_height):
+    action_buttons = {
+        action_type: pygame.Rect(10 + (110 * i), screen_height - 180, 100, 40)
+        for i, action_type in enumerate(["attack", "magic", "item"])
+    }
     move_button = pygame.Rect(10, screen_height - 60, 100, 50)
     end_turn_button = pygame.Rect(120, screen_height - 60, 100, 50)
-    pygame.draw.rect(screen, GRAY, move_button)
-    pygame.draw.rect(screen, GRAY, end_turn_button)
-    screen.blit(font.render("Move", True, BLACK), (move_button.x + 10, move_button.y + 10))
-    screen.blit(font.render("End Turn", True, BLACK), (end_turn_button.x + 10, end_turn_button.y + 10))
-
     return move_button, end_turn_button, action_buttons
 
-def render_skill_buttons(screen, font, skills_data, skill_buttons, selected_attack):
-    for skill_id, rect in skill_buttons.items():
-        skill = skills_data.get(skill_id)
-        if not skill:
-            continue
-        is_selected = (skill_id == selected_attack)
-        bg_color = YELLOW if is_selected else GRAY
-        pygame.draw.rect(screen, bg_color, rect)
-        label = skill["name"]
-        text = font.render(label, True, BLACK)
-        screen.blit(text, (rect.x + 5, rect.y + 5))
-
-def draw_units(screen, font, all_units, selected_character, tile_size):
+def button_rect(font, rect, label, padding=10):
+    # Labels can run past narrow buttons; this covers both.
+    return rect.union(pygame.Rect((rect.x + padding, rect.y + padding), font.size(label)))
+
+def draw_button(screen, font, rect, label, color=GRAY, padding=10):
+    pygame.draw.rect(screen, color, rect)
+    screen.blit(render_text(font, label, BLACK), (rect.x + padding, rect.y + padding))
+
+def unit_rect(font, c, tile_size):
+    # The tile plus the HP label drawn above it.
+    rect = tile_rect(c.x, c.y, tile_size)
+    return rect.union(pygame.Rect((rect.x, rect.y - 12), font.size(f"{c.current_hp}/{c.hp}")))
+
+def tile_surface(color, tile_size, width=0):
+    # Shared solid (or, with width, outlined) tiles so units can be drawn
+    # with blits alone.
+    key = (color, tile_size, width)
+    surface = _tile_surfaces.get(key)
+    if surface is None:
+        surface = pygame.Surface((tile_size, tile_size), pygame.SRCALPHA)
+        pygame.draw.rect(surface, color, surface.get_rect(), width)
+        _tile_surfaces[key] = surface
+    return surface
+
+def unit_blits(font, c, selected, tile_size, sprite=None):
+    # The blits for one unit; sprite is a (surface, area) region.
+    x, y = c.x * tile_size, c.y * tile_size
+    if sprite is not None:
+        blits = [(sprite[0], (x, y), sprite[1])]
+    else:
+        # No sprite in the campaign or base assets: a coloured tile and initial.
+        blits = [
+            (tile_surface(BLUE if c.team == "player" else RED, tile_size), (x, y)),
+            (render_text(font, c.name[0].upper(), WHITE), (x + 10, y + 5)),
+        ]
+    if selected:
+        blits.append((tile_surface(GREEN, tile_size, 3), (x, y)))
+    blits.append((render_text(font, f"{c.current_hp}/{c.hp}", BLACK), (x, y - 12)))
+    return blits
+
+def draw_units(screen, font, all_units, selected_character, tile_size, sprite_for=None):
+    # Every unit in one Surface.blits() batch.
+    blits = []
     for c in all_units:
-        color = BLUE if c.team == "player" else RED
-        rect = pygame.Rect(c.x * tile_size, c.y * tile_size, tile_size, tile_size)
-        pygame.draw.rect(screen, color, rect)
-        if c == selected_character:
-            pygame.draw.rect(screen, GREEN, rect, 3)
-        letter = font.render(c.name[0].upper(), True, WHITE)
-        screen.blit(letter, (rect.x + 10, rect.y + 5))
-        hp_text = font.render(f"{c.current_hp}/{c.hp}", True, BLACK)
-        screen.blit(hp_text, (rect.x, rect.y - 12))
+        sprite = sprite_for(c) if sprite_for is not None else None
+        blits.extend(unit_blits(font, c, c is selected_character, tile_size, sprite))
+    screen.blits(blits, False)
 
 def draw_game_over_screen(screen, font, screen_width, screen_height):
     overlay = pygame.Surface((screen_width, screen_height))
@@ -103,8 +205,8 @@ def draw_game_over_screen(screen, font, screen_width, screen_height):
     overlay.fill(BLACK)
     screen.blit(overlay, (0, 0))
 
-    game_over_text = font.render("Game Over", True, RED)
-    quit_text = font.render("Quit", True, BLACK)
+    game_over_text = render_text(font, "Game Over", RED)
+    quit_text = render_text(font, "Quit", BLACK)
 
     text_rect = game_over_text.get_rect(center=(screen_width // 2, screen_height // 3))
     quit_button = pygame.Rect(screen_width // 2 - 60, screen_height // 2, 120, 50)
@@ -121,7 +223,7 @@ def draw_victory_screen(screen, font, screen_width, screen_height):
     overlay.fill(BLACK)
     screen.blit(overlay, (0, 0))
 
-    congrats_text = font.render("Victory!", True, GREEN)
+    congrats_text = render_text(font, "Victory!", GREEN)
     save_btn = pygame.Rect(screen_width // 2 - 150, screen_height // 2, 100, 50)
     next_btn = pygame.Rect(screen_width // 2 - 50, screen_height // 2, 100, 50)
     quit_btn = pygame.Rect(screen_width // 2 + 50, screen_height // 2, 100, 50)
@@ -131,13 +233,14 @@ def draw_victory_screen(screen, font, screen_width, screen_height):
     pygame.draw.rect(screen, GRAY, quit_btn)
 
     screen.blit(congrats_text, congrats_text.get_rect(center=(screen_width // 2, screen_height // 3)))
-    screen.blit(font.render("Save", True, BLACK), (save_btn.x + 25, save_btn.y + 15))
-    screen.blit(font.render("Next", True, BLACK), (next_btn.x + 25, next_btn.y + 15))
-    screen.blit(font.render("Quit", True, BLACK), (quit_btn.x + 25, quit_btn.y + 15))
+    screen.blit(render_text(font, "Save", BLACK), (save_btn.x + 25, save_btn.y + 15))
+    screen.blit(render_text(font, "Next", BLACK), (next_btn.x + 25, next_btn.y + 15))
+    screen.blit(render_text(font, "Quit", BLACK), (quit_btn.x + 25, quit_btn.y + 15))
 
     return save_btn, next_btn, quit_btn
 
-def draw_choose_player_character(screen, font, starters, SCREEN_WIDTH, SCREEN_HEIGHT, SCALE, WHITE, BLACK):
+def draw_choose_player_character(screen, font, starters, SCREEN_WIDTH, SCREEN_HEIGHT, SCALE, WHITE, BLACK, scheduler=None):
+    scheduler = scheduler or FrameScheduler()
     button_height = int(50 * SCALE)
     spacing = int(20 * SCALE)
     buttons = []
@@ -151,16 +254,18 @@ def draw_choose_player_character(screen, font, starters, SCREEN_WIDTH, SCREEN_HE
         )
         buttons.append((rect, character_data))
 
+    redraw = True
     while True:
-        screen.fill(WHITE)
-        for rect, character_data in buttons:
-            pygame.draw.rect(screen, GRAY, rect)
-            text_surface = font.render(character_data["name"], True, BLACK)
-            screen.blit(text_surface, (rect.x + 10, rect.y + 10))
-
-        pygame.display.flip()
-
-        for event in pygame.event.get():
+        if redraw:
+            screen.fill(WHITE)
+            for rect, character_data in buttons:
+                pygame.draw.rect(screen, GRAY, rect)
+                text_surface = render_text(font, character_data["name"], BLACK)
+                screen.blit(text_surface, (rect.x + 10, rect.y + 10))
+            pygame.display.flip()
+            redraw = False
+
+        for event in scheduler.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -169,6 +274,8 @@ def draw_choose_player_character(screen, font, starters, SCREEN_WIDTH, SCREEN_HE
                 for rect, character_data in buttons:
                     if rect.collidepoint(mx, my):
                         return character_data["name"]
+            elif needs_redraw(event):
+                redraw = True
 
 def draw_main_menu(screen, font, screen_width, screen_height, title="Tactical RPG"):
     menu_items = ["New Game", "Load Game", "Options", "Quit"]
@@ -179,8 +286,8 @@ def draw_main_menu(screen, font, screen_width, screen_height, title="Tactical RP
     button_height = max(40, int(screen_height * 0.06))
     spacing = max(10, int(screen_height * 0.02))
 
-    title_font = pygame.font.SysFont(None, title_font_size)
-    title_surface = title_font.render(title, True, BLACK)
+    title_font = get_font(None, title_font_size)
+    title_surface = render_text(title_font, title, BLACK)
     title_rect = title_surface.get_rect(center=(screen_width // 2, screen_height // 5))
 
     total_height = len(menu_items) * (button_height + spacing)
@@ -200,17 +307,17 @@ def draw_main_menu(screen, font, screen_width, screen_height, title="Tactical RP
 
     for label, rect in buttons:
         pygame.draw.rect(screen, GRAY, rect)
-        text = font.render(label, True, BLACK)
+        text = render_text(font, label, BLACK)
         screen.blit(text, (rect.x + 20, rect.y + 12))
 
     pygame.display.flip()
     return buttons
 
-def run_main_menu(screen, font, screen_width, screen_height):
+def run_main_menu(screen, font, screen_width, screen_height, scheduler=None):
+    scheduler = scheduler or FrameScheduler()
+    buttons = draw_main_menu(screen, font, screen_width, screen_height)
     while True:
-        buttons = draw_main_menu(screen, font, screen_width, screen_height)
-
-        for event in pygame.event.get():
+        for event in scheduler.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -221,12 +328,18 @@ def run_main_menu(screen, font, screen_width, screen_height):
                     if rect.collidepoint(mx, my):
                         if label == "New Game":
                             return "new_game"
+                        elif label == "Load Game":
+                            return "load_game"
                         elif label == "Quit":
                             pygame.quit()
                             sys.exit()
 
+            elif needs_redraw(event):
+                buttons = draw_main_menu(screen, font, screen_width, screen_height)
+
 # 🆕 CAMPAIGN SELECT SCREEN
-def run_campaign_select(screen, font, screen_width, screen_height):
+def run_campaign_select(screen, font, screen_width, screen_height, scheduler=None):
+    scheduler = scheduler or FrameScheduler()
     campaigns = [d for d in os.listdir("campaigns") if os.path.isdir(os.path.join("campaigns", d))]
     spacing = 20
     button_height = 60
@@ -243,19 +356,22 @@ def run_campaign_select(screen, font, screen_width, screen_height):
         )
         buttons.append((rect, campaign))
 
+    redraw = True
     while True:
-        screen.fill(WHITE)
-        title = font.render("Choose a Campaign", True, BLACK)
-        screen.blit(title, (screen_width // 2 - title.get_width() // 2, 50))
+        if redraw:
+            screen.fill(WHITE)
+            title = render_text(font, "Choose a Campaign", BLACK)
+            screen.blit(title, (screen_width // 2 - title.get_width() // 2, 50))
 
-        for rect, label in buttons:
-            pygame.draw.rect(screen, GRAY, rect)
-            text = font.render(label, True, BLACK)
-            screen.blit(text, (rect.x + 10, rect.y + 15))
+            for rect, label in buttons:
+                pygame.draw.rect(screen, GRAY, rect)
+                text = render_text(font, label, BLACK)
+                screen.blit(text, (rect.x + 10, rect.y + 15))
 
-        pygame.display.flip()
+            pygame.display.flip()
+            redraw = False
 
-        for event in pygame.event.get():
+        for event in scheduler.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -264,3 +380,5 @@ def run_campaign_select(screen, font, screen_width, screen_height):
                 for rect, label in buttons:
                     if rect.collidepoint(mx, my):
                         return label
+            elif needs_redraw(event):
+                redraw = True
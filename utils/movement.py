@@ -0,0 +1,146 @@
+from heapq import heappop, heappush
+
+
+# Costs are in half-tiles: an orthogonal step is 1 tile, a diagonal 1.5.
+# On open ground this matches the old Euclidean radius check up to range 4.
+STEP_COST = 2
+DIAGONAL_COST = 3
+NEIGHBOURS = (
+    (1, 0, STEP_COST), (-1, 0, STEP_COST), (0, 1, STEP_COST), (0, -1, STEP_COST),
+    (1, 1, DIAGONAL_COST), (1, -1, DIAGONAL_COST), (-1, 1, DIAGONAL_COST), (-1, -1, DIAGONAL_COST),
+)
+
+
+class Terrain:
+    def __init__(self, width: int, height: int, costs: dict = None):
+        self.width = width
+        self.height = height
+        self.costs = costs or {}  # (x, y) -> integer cost multiplier, None for impassable
+        self.version = 0
+        self._flat = None
+        self._adjacency = None
+        self._max_cost = None
+
+    def cost(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return self.costs.get((x, y), 1)
+
+    def passable(self, x, y):
+        return self.cost(x, y) is not None
+
+    def set_cost(self, x, y, cost):
+        if cost == 1:
+            self.costs.pop((x, y), None)
+        else:
+            self.costs[(x, y)] = cost
+        self.version += 1
+        self._flat = None
+        self._adjacency = None
+        self._max_cost = None
+
+    def flat_costs(self):
+        # Row-major list of tile costs, rebuilt only after set_cost.
+        if self._flat is None:
+            self._flat = [
+                self.costs.get((x, y), 1)
+                for y in range(self.height)
+                for x in range(self.width)
+            ]
+        return self._flat
+
+    def max_cost(self):
+        if self._max_cost is None:
+            self._max_cost = max((c for c in self.flat_costs() if c is not None), default=1)
+        return self._max_cost
+
+    def adjacency(self):
+        # Per flat index, the (neighbour index, step cost) pairs a unit may walk.
+        if self._adjacency is not None:
+            return self._adjacency
+
+        width = self.width
+        height = self.height
+        costs = self.flat_costs()
+        adjacency = []
+        for index, cost in enumerate(costs):
+            if cost is None:
+                adjacency.append(())
+                continue
+            y, x = divmod(index, width)
+            west = x > 0 and costs[index - 1] is not None
+            east = x < width - 1 and costs[index + 1] is not None
+            north = y > 0 and costs[index - width] is not None
+            south = y < height - 1 and costs[index + width] is not None
+            adjacency.append(tuple(
+                (neighbour, step)
+                for ok, neighbour, step in (
+                    (west, index - 1, STEP_COST),
+                    (east, index + 1, STEP_COST),
+                    (north, index - width, STEP_COST),
+                    (south, index + width, STEP_COST),
+                    # No squeezing diagonally between two walls.
+                    (west and north, index - width - 1, DIAGONAL_COST),
+                    (east and north, index - width + 1, DIAGONAL_COST),
+                    (west and south, index + width - 1, DIAGONAL_COST),
+                    (east and south, index + width + 1, DIAGONAL_COST),
+                )
+                if ok and costs[neighbour] is not None
+            ))
+        self._adjacency = adjacency
+        return adjacency
+
+
+def reachable_tiles(start_x, start_y, move_range, terrain, is_blocked=None):
+    # Bounded Dijkstra; returns {(x, y): cost} for every tile a unit can end on.
+    budget = move_range * STEP_COST
+    start = (start_x, start_y)
+    best = {start: 0}
+    frontier = [(0, start_x, start_y)]
+    cost_at = terrain.cost
+
+    while frontier:
+        cost, x, y = heappop(frontier)
+        if cost > best[(x, y)]:
+            continue
+        for dx, dy, step in NEIGHBOURS:
+            nx = x + dx
+            ny = y + dy
+            tile_cost = cost_at(nx, ny)
+            if tile_cost is None:
+                continue
+            # No squeezing diagonally between two walls.
+            if dx and dy and (cost_at(x + dx, y) is None or cost_at(x, y + dy) is None):
+                continue
+            new_cost = cost + step * tile_cost
+            if new_cost > budget or new_cost >= best.get((nx, ny), budget + 1):
+                continue
+            if is_blocked and is_blocked(nx, ny):
+                continue
+            best[(nx, ny)] = new_cost
+            heappush(frontier, (new_cost, nx, ny))
+
+    del best[start]
+    return best
+
+
+class ReachabilityCache:
+    # Reachable tiles per unit, computed once and reused until something moves.
+    def __init__(self, terrain, grid, move_range):
+        self.terrain = terrain
+        self.grid = grid
+        self.move_range = move_range
+        self._cache = {}
+
+    def get(self, unit):
+        # Entries also go stale when the terrain changes under them.
+        key = (unit.x, unit.y, self.terrain.version)
+        cached = self._cache.get(id(unit))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        tiles = reachable_tiles(unit.x, unit.y, self.move_range, self.terrain, self.grid.get)
+        self._cache[id(unit)] = (key, tiles)
+        return tiles
+
+    def invalidate(self):
+        self._cache.clear()
@@ -0,0 +1,141 @@
+from utils.movement import DIAGONAL_COST
+
+
+UNREACHED = float("inf")
+
+
+class DistanceField:
+    # Walking cost from every tile to the nearest source tile.
+    # Units are ignored so one field can be shared by every unit chasing the
+    # same sources; occupancy is handled by the reachable set at move time.
+    # Costs are small integers, so this is Dial's algorithm (a ring of cost
+    # buckets) rather than a heap, and it is resumable: tiles are only
+    # settled once someone asks for them.
+    def __init__(self, terrain, sources):
+        self.width = terrain.width
+        self.height = terrain.height
+        self.terrain_version = terrain.version
+        self.sources = tuple(sources)
+        self.costs = terrain.flat_costs()
+        self.adjacency = terrain.adjacency()
+
+        size = self.width * self.height
+        self.dist = [UNREACHED] * size
+        self.settled = bytearray(size)
+        self.span = DIAGONAL_COST * terrain.max_cost() + 1
+        self.buckets = [[] for _ in range(self.span)]
+        self.current = 0
+        self.queued = 0
+
+        for x, y in self.sources:
+            if 0 <= x < self.width and 0 <= y < self.height and self.costs[y * self.width + x] is not None:
+                index = y * self.width + x
+                self.dist[index] = 0
+                self.buckets[0].append(index)
+                self.queued += 1
+
+    def distance(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        index = y * self.width + x
+        if not self.settled[index]:
+            self._expand_until(index)
+        d = self.dist[index]
+        return None if d == UNREACHED else d
+
+    def complete(self):
+        self._expand_until(None)
+        return self
+
+    def _expand_until(self, goal):
+        costs = self.costs
+        adjacency = self.adjacency
+        dist = self.dist
+        settled = self.settled
+        buckets = self.buckets
+        span = self.span
+        current = self.current
+        queued = self.queued
+
+        while queued:
+            bucket = buckets[current % span]
+            while bucket:
+                index = bucket.pop()
+                queued -= 1
+                if settled[index] or dist[index] != current:
+                    continue
+                settled[index] = 1
+
+                # Stepping onto this tile from a neighbour costs this tile's multiplier.
+                tile_cost = costs[index]
+                for neighbour, step in adjacency[index]:
+                    new_cost = current + step * tile_cost
+                    if new_cost < dist[neighbour]:
+                        dist[neighbour] = new_cost
+                        buckets[new_cost % span].append(neighbour)
+                        queued += 1
+
+                if index == goal:
+                    self.current = current
+                    self.queued = queued
+                    return
+            current += 1
+
+        self.current = current
+        self.queued = queued
+
+
+class _TargetFields:
+    __slots__ = ("fresh", "stale")
+
+    def __init__(self, fresh):
+        self.fresh = fresh
+        self.stale = None
+
+
+class DistanceFieldCache:
+    # One field per chased unit, shared by all its pursuers.
+    # When the unit moves its field is demoted rather than thrown away:
+    # walking costs change by at most the distance the unit moved, so
+    # pursuers far enough away keep steering by the old field while the
+    # new one only expands as far as the nearby pursuers need.
+    STALE_FACTOR = 8
+
+    def __init__(self, terrain):
+        self.terrain = terrain
+        self._fields = {}
+
+    def toward(self, unit, pursuer=None):
+        entry = self._fields.get(id(unit))
+        if entry is None or entry.fresh.terrain_version != self.terrain.version:
+            entry = _TargetFields(DistanceField(self.terrain, [(unit.x, unit.y)]))
+            self._fields[id(unit)] = entry
+        elif entry.fresh.sources != ((unit.x, unit.y),):
+            self._demote(entry, unit)
+
+        stale = entry.stale
+        if pursuer is None or stale is None:
+            return entry.fresh
+
+        shift = stale.distance(unit.x, unit.y)
+        away = stale.distance(pursuer.x, pursuer.y)
+        if shift is not None and away is not None and away >= self.STALE_FACTOR * max(shift, 1):
+            return stale
+        return entry.fresh
+
+    def _demote(self, entry, unit):
+        # Keep whichever old field has explored further.
+        if entry.stale is None or entry.fresh.current >= entry.stale.current:
+            entry.stale = entry.fresh
+        entry.fresh = DistanceField(self.terrain, [(unit.x, unit.y)])
+
+    def unit_moved(self, unit):
+        entry = self._fields.get(id(unit))
+        if entry is not None:
+            self._demote(entry, unit)
+
+    def unit_removed(self, unit):
+        self._fields.pop(id(unit), None)
+
+    def invalidate(self):
+        self._fields.clear()
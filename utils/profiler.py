@@ -0,0 +1,144 @@
+from collections import deque
+import json
+import math
+import os
+import time
+
+
+PROFILE_WINDOW = 240  # Frames of history behind the rolling percentiles.
+MAX_TRACE_FRAMES = 600
+WAIT_PHASE = "wait"  # Time spent blocked on input; left out of frame work time.
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class FrameProfiler:
+    # Times named phases of each frame. Every frame feeds rolling per-phase
+    # histories; every sample_every-th frame also keeps its raw timings for
+    # export as a Chrome trace (chrome://tracing or ui.perfetto.dev).
+    # Phases can nest and a phase entered twice in a frame adds up.
+    def __init__(self, window=PROFILE_WINDOW, sample_every=0, max_trace_frames=MAX_TRACE_FRAMES):
+        self.window = window
+        self.sample_every = sample_every
+        self.frame_count = 0
+        self.frames = deque(maxlen=window)  # Work time per frame, in ms.
+        self.history = {}  # phase -> deque of ms per frame it ran in
+        self.trace = deque(maxlen=max_trace_frames)
+        self._frame_start = None
+        self._current = {}
+        self._events = None
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def _record(self, name, start, end):
+        self._current[name] = self._current.get(name, 0.0) + (end - start)
+        if self._events is not None:
+            self._events.append((name, start, end))
+
+    def next_frame(self):
+        # Closes the previous frame (if any) and starts a new one; call once
+        # at the top of the main loop.
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self._finish(now)
+        self.frame_count += 1
+        self._frame_start = now
+        self._current = {}
+        sampled = self.sample_every and self.frame_count % self.sample_every == 0
+        self._events = [] if sampled else None
+
+    def finish(self):
+        if self._frame_start is not None:
+            self._finish(time.perf_counter())
+            self._frame_start = None
+
+    def _finish(self, now):
+        work = now - self._frame_start - self._current.get(WAIT_PHASE, 0.0)
+        self.frames.append(work * 1000)
+        history = self.history
+        for name, seconds in self._current.items():
+            values = history.get(name)
+            if values is None:
+                values = history[name] = deque(maxlen=self.window)
+            values.append(seconds * 1000)
+        if self._events is not None:
+            self.trace.append((self.frame_count, self._frame_start, now, self._events))
+
+    def summary(self, values):
+        values = sorted(values)
+        return {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else 0.0,
+        }
+
+    def stats(self):
+        return {
+            "frame": self.summary(self.frames),
+            "phases": {name: self.summary(values) for name, values in self.history.items()},
+        }
+
+    def worst(self, count=4):
+        # Phases with the highest p95, slowest first; waiting doesn't count.
+        phases = self.stats()["phases"]
+        ranked = sorted(
+            ((name, s) for name, s in phases.items() if name != WAIT_PHASE),
+            key=lambda item: item[1]["p95"],
+            reverse=True
+        )
+        return ranked[:count]
+
+    def hud_lines(self, count=4):
+        frame = self.summary(self.frames)
+        lines = [f"frame {frame['p50']:.1f} ms  p95 {frame['p95']:.1f}  max {frame['max']:.1f}"]
+        for name, s in self.worst(count):
+            lines.append(f"{name}: p95 {s['p95']:.2f}  max {s['max']:.2f}")
+        return lines
+
+    def chrome_trace(self):
+        # Trace Event Format "complete" events, timestamps in microseconds.
+        pid = os.getpid()
+        events = []
+        for frame, start, end, phases in self.trace:
+            events.append({
+                "name": "frame", "cat": "frame", "ph": "X", "pid": pid, "tid": 0,
+                "ts": start * 1e6, "dur": (end - start) * 1e6, "args": {"frame": frame}
+            })
+            for name, phase_start, phase_end in phases:
+                events.append({
+                    "name": name, "cat": "phase", "ph": "X", "pid": pid, "tid": 0,
+                    "ts": phase_start * 1e6, "dur": (phase_end - phase_start) * 1e6
+                })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
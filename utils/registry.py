@@ -0,0 +1,133 @@
+from collections import Counter
+import heapq
+
+
+BUCKET_SIZE = 8
+
+
+class UnitRegistry:
+    # Living units by team, plus coarse grid buckets for nearest-opponent
+    # searches. Ties on distance go to the unit registered first, which is
+    # the order of the unit list, so results match a min() over that list.
+    def __init__(self, units=(), bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.counts = Counter()
+        self.teams = {}
+        self.buckets = {}
+        self._where = {}
+        self._order = {}
+        self._seq = 0
+        for unit in units:
+            self.add(unit)
+
+    def _bucket_key(self, x, y):
+        return (x // self.bucket_size, y // self.bucket_size)
+
+    def add(self, unit):
+        key = id(unit)
+        if key in self._where:
+            return
+        self._order[key] = self._seq
+        self._seq += 1
+        self.teams.setdefault(unit.team, {})[key] = unit
+        self.counts[unit.team] += 1
+        bucket = self._bucket_key(unit.x, unit.y)
+        self.buckets.setdefault(bucket, {})[key] = unit
+        self._where[key] = bucket
+
+    def remove(self, unit):
+        key = id(unit)
+        bucket = self._where.pop(key, None)
+        if bucket is None:
+            return False
+        del self._order[key]
+        del self.teams[unit.team][key]
+        self.counts[unit.team] -= 1
+        members = self.buckets[bucket]
+        del members[key]
+        if not members:
+            del self.buckets[bucket]
+        return True
+
+    def moved(self, unit):
+        # Call after changing unit.x / unit.y.
+        key = id(unit)
+        old = self._where.get(key)
+        if old is None:
+            return
+        new = self._bucket_key(unit.x, unit.y)
+        if new == old:
+            return
+        members = self.buckets[old]
+        del members[key]
+        if not members:
+            del self.buckets[old]
+        self.buckets.setdefault(new, {})[key] = unit
+        self._where[key] = new
+
+    def __contains__(self, unit):
+        return id(unit) in self._where
+
+    def __len__(self):
+        return len(self._where)
+
+    def count(self, team):
+        return self.counts[team]
+
+    def living(self, team):
+        return list(self.teams.get(team, {}).values())
+
+    def opponents_remaining(self, team):
+        return len(self._where) - self.counts[team]
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield (cx, cy)
+            return
+        for bx in range(cx - r, cx + r + 1):
+            yield (bx, cy - r)
+            yield (bx, cy + r)
+        for by in range(cy - r + 1, cy + r):
+            yield (cx - r, by)
+            yield (cx + r, by)
+
+    def k_nearest_opponents(self, unit, k):
+        # Up to k living units on other teams, nearest first.
+        remaining = self.opponents_remaining(unit.team)
+        if k <= 0 or remaining <= 0:
+            return []
+
+        x, y, team = unit.x, unit.y, unit.team
+        cx, cy = self._bucket_key(x, y)
+        buckets = self.buckets
+        order = self._order
+        size = self.bucket_size
+        best = []  # max-heap of (-d2, -seq, unit), so best[0] is the worst kept
+        seen = 0
+        r = 0
+
+        while seen < remaining:
+            for bucket in self._ring(cx, cy, r):
+                members = buckets.get(bucket)
+                if not members:
+                    continue
+                for key, other in members.items():
+                    if other.team == team:
+                        continue
+                    seen += 1
+                    item = (-((other.x - x) ** 2 + (other.y - y) ** 2), -order[key], other)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item[:2] > best[0][:2]:
+                        heapq.heapreplace(best, item)
+
+            # Anything in ring r + 1 is at least r * size + 1 tiles away on some axis.
+            if len(best) == k and -best[0][0] < (r * size + 1) ** 2:
+                break
+            r += 1
+
+        return [other for _, _, other in sorted(best, key=lambda item: item[:2], reverse=True)]
+
+    def nearest_opponent(self, unit):
+        nearest = self.k_nearest_opponents(unit, 1)
+        return nearest[0] if nearest else None
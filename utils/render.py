@@ -0,0 +1,118 @@
+import pygame
+
+
+LAYER_ORDER = ("units", "overlay", "ui")
+CLEAR = (0, 0, 0, 0)
+
+
+def merge_rects(rects):
+    # Unions overlapping rects so shared regions are only composited once.
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        if rect.width <= 0 or rect.height <= 0:
+            continue
+        i = 0
+        while i < len(merged):
+            if merged[i].colliderect(rect):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+class Layer:
+    # A transparent surface holding keyed items: key -> (state, rect, draw).
+    # draw(surface) must stay inside rect; an item is redrawn only when its
+    # state or rect changes, or when a changed neighbour overlaps it.
+    # draw can also be a list of blits, (source, dest) or (source, dest,
+    # area); consecutive ones go out as a single Surface.blits() call.
+    def __init__(self, size):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.items = {}
+        self.dirty = []
+
+    def update(self, items):
+        old = self.items
+        changed = []
+        for key, (state, rect, draw) in items.items():
+            previous = old.get(key)
+            if previous is None:
+                changed.append(rect)
+            elif previous[0] != state or previous[1] != rect:
+                changed.append(rect)
+                changed.append(previous[1])
+        for key in old.keys() - items.keys():
+            changed.append(old[key][1])
+
+        self.items = items
+        if changed:
+            changed = merge_rects(changed)
+            self._redraw(changed)
+            self.dirty.extend(changed)
+
+    def _redraw(self, rects):
+        surface = self.surface
+        for rect in rects:
+            surface.set_clip(rect)
+            surface.fill(CLEAR, rect)
+            batch = []
+            for state, item_rect, draw in self.items.values():
+                if not item_rect.colliderect(rect):
+                    continue
+                if callable(draw):
+                    if batch:
+                        surface.blits(batch, False)
+                        batch = []
+                    draw(surface)
+                else:
+                    batch.extend(draw)
+            if batch:
+                surface.blits(batch, False)
+        surface.set_clip(None)
+
+    def clear(self):
+        self.items = {}
+        self.surface.fill(CLEAR)
+        self.dirty.clear()
+
+
+class LayeredRenderer:
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self.layers = {name: Layer(screen.get_size()) for name in LAYER_ORDER}
+        self.needs_full_redraw = True
+
+    def layer(self, name):
+        return self.layers[name]
+
+    def set_background(self, background):
+        self.background = background
+        self.needs_full_redraw = True
+
+    def invalidate(self):
+        # Something drew straight to the screen; repaint everything next frame.
+        self.needs_full_redraw = True
+
+    def present(self):
+        if self.needs_full_redraw:
+            rects = [self.screen.get_rect()]
+            self.needs_full_redraw = False
+        else:
+            rects = merge_rects(r for layer in self.layers.values() for r in layer.dirty)
+        for layer in self.layers.values():
+            layer.dirty.clear()
+
+        if not rects:
+            return rects
+
+        screen = self.screen
+        for rect in rects:
+            screen.blit(self.background, rect, rect)
+            for name in LAYER_ORDER:
+                screen.blit(self.layers[name].surface, rect, rect)
+        pygame.display.update(rects)
+        return rects
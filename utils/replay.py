@@ -0,0 +1,204 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+
+from res.campaign import CAMPAIGNS_DIR
+from res.planner import Plan
+from utils.battle import BattleSession
+from utils.rng import BattleRng
+
+
+REPLAY_VERSION = 1
+REPLAYS_DIR = "replays"
+
+
+class ReplayError(Exception):
+    pass
+
+
+def state_digest(session):
+    # Fingerprint of the battle state, to catch replays that drift.
+    state = [
+        [ref, u.current_hp, u.x, u.y]
+        for ref, u in enumerate(session.units_by_ref)
+    ]
+    payload = json.dumps([state, session.outcome, session.turns_taken], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ReplayPlanner:
+    # Answers each AI turn with the decision recorded for it.
+    def __init__(self):
+        self.session = None
+        self.pending = None
+
+    def reseed(self, rng):
+        pass
+
+    def choose(self, enemy, all_units, attacks_data, reachable, forecast=None, terrain=None):
+        action = self.pending
+        self.pending = None
+        if action is None:
+            raise ReplayError(f"no recorded decision for {enemy.name}'s turn")
+        _, x, y, attack_id, target_ref = action
+        return Plan((x, y), attack_id, self.session.unit_by_ref(target_ref))
+
+
+class Replay:
+    # A header describing the battle (campaign, line-up, seed) plus the
+    # action stream; stored as gzipped JSON.
+    def __init__(self, header, actions, final=None):
+        self.header = header
+        self.actions = actions
+        self.final = final
+
+    @classmethod
+    def from_session(cls, session):
+        header = {
+            "version": REPLAY_VERSION,
+            "seed": session.seed,
+            "ai_teams": sorted(session.ai_teams),
+            "grid": [session.grid_width, session.grid_height],
+            **session.setup,
+        }
+        return cls(header, [list(a) for a in session.actions], state_digest(session))
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {"header": self.header, "actions": self.actions, "final": self.final}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        header = data["header"]
+        if header.get("version") != REPLAY_VERSION:
+            raise ReplayError(f"{path}: unsupported replay version {header.get('version')}")
+        return cls(header, data["actions"], data.get("final"))
+
+    def start(self, **kwargs):
+        header = self.header
+        planner = ReplayPlanner()
+        width, height = header["grid"]
+        session = BattleSession.from_campaign(
+            header["campaign"],
+            party_names=header["party"],
+            enemy_names=header["enemies"],
+            root=header.get("root", CAMPAIGNS_DIR),
+            ai_teams=header["ai_teams"],
+            grid_width=width,
+            grid_height=height,
+            planner=planner,
+            rng=BattleRng(header["seed"]),
+            **kwargs
+        )
+        planner.session = session
+        return ReplayPlayer(self, session, planner)
+
+
+class ReplayPlayer:
+    def __init__(self, replay, session, planner):
+        self.replay = replay
+        self.session = session
+        self.planner = planner
+        self.cursor = 0
+
+    @property
+    def finished(self):
+        return self.session.done or (self.cursor >= len(self.replay.actions) and self.session.awaiting_input())
+
+    def _next(self):
+        if self.cursor >= len(self.replay.actions):
+            return None
+        action = self.replay.actions[self.cursor]
+        self.cursor += 1
+        return action
+
+    def advance(self):
+        # Plays one recorded action (or one skipped turn). False once done.
+        session = self.session
+        if session.done:
+            return False
+
+        if not session.awaiting_input():
+            if session.active.current_hp <= 0 or not session.is_ai_turn():
+                return session.step()
+            if self.cursor >= len(self.replay.actions):
+                return False
+            action = self._next()
+            if action[0] != "ai":
+                raise ReplayError(f"expected an AI turn at action {self.cursor - 1}, found {action[0]!r}")
+            self.planner.pending = action
+            return session.step()
+
+        action = self._next()
+        if action is None:
+            return False
+        if action[0] not in ("m", "a", "e"):
+            raise ReplayError(f"expected a player action at action {self.cursor - 1}, found {action[0]!r}")
+        session.replay_action(action)
+        return True
+
+    def run(self):
+        while self.advance():
+            pass
+        return self.session
+
+    def verify(self):
+        digest = state_digest(self.session)
+        if self.replay.final and digest != self.replay.final:
+            raise ReplayError(f"replay ended in state {digest}, recorded {self.replay.final}")
+        return digest
+
+
+def fast_forward(path, **kwargs):
+    player = Replay.load(path).start(**kwargs)
+    player.run()
+    player.verify()
+    return player.session
+
+
+def replay_path_for(name, directory=REPLAYS_DIR):
+    return os.path.join(directory, f"{name}.replay")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fast-forward recorded battles headlessly.")
+    parser.add_argument("replays", nargs="+", help="Replay files")
+    parser.add_argument("--repeat", type=int, default=1, help="Play each replay this many times (for benchmarking)")
+    args = parser.parse_args(argv)
+
+    from utils.trace import tracer
+    tracer.disable()
+
+    failed = 0
+    total_time = 0.0
+    for path in args.replays:
+        try:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                session = fast_forward(path)
+            elapsed = (time.perf_counter() - start) / args.repeat
+        except (ReplayError, OSError, KeyError, ValueError) as e:
+            failed += 1
+            print(f"[REPLAY] {path}: FAILED ({e})")
+            continue
+        total_time += elapsed
+        print(f"[REPLAY] {path}: {session.outcome or 'unfinished'} after {session.turns_taken} turns, "
+              f"{len(session.actions)} actions, {elapsed * 1000:.2f} ms")
+
+    print(f"[REPLAY] {len(args.replays) - failed}/{len(args.replays)} replays matched, {total_time * 1000:.2f} ms total")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
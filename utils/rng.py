@@ -0,0 +1,33 @@
+import random
+import secrets
+
+
+STREAMS = ("initiative", "attack", "ai")
+
+
+class BattleRng:
+    # Independent seeded streams for one battle, so extra AI sampling never
+    # shifts the attack dice and vice versa. String seeds are hashed the same
+    # way on every platform and Python run.
+    def __init__(self, seed=None):
+        self.seed = secrets.randbits(32) if seed is None else seed
+        self.streams = {name: random.Random(f"{self.seed}:{name}") for name in STREAMS}
+
+    @property
+    def initiative(self):
+        return self.streams["initiative"]
+
+    @property
+    def attack(self):
+        return self.streams["attack"]
+
+    @property
+    def ai(self):
+        return self.streams["ai"]
+
+    def getstate(self):
+        return {name: stream.getstate() for name, stream in self.streams.items()}
+
+    def setstate(self, state):
+        for name, stream_state in state.items():
+            self.streams[name].setstate(stream_state)
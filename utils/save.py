@@ -0,0 +1,262 @@
+import glob
+import io
+import os
+import pickle
+import queue
+import secrets
+import struct
+import threading
+import zlib
+
+from utils.battle import BattleSession
+from utils.trace import tracer
+
+
+SAVE_VERSION = 1
+SAVES_DIR = "saves"
+AUTOSAVE_NAME = "autosave"
+QUICKSAVE_NAME = "quicksave"
+FULL_EVERY = 20  # Autosaves between full snapshots; the rest are deltas.
+
+MAGIC = b"AELS"
+HEADER = struct.Struct("<4sHBxIII")  # magic, version, kind, snapshot id, base id, crc32
+FULL = 0
+DELTA = 1
+
+# Snapshot sections replaced wholesale when they change. Unit rows, the
+# log and the action list get finer-grained deltas.
+SECTIONS = ("static", "roster", "battle", "timeline", "rng")
+
+
+class SaveError(Exception):
+    pass
+
+
+class _PlainUnpickler(pickle.Unpickler):
+    # Snapshots only hold built-in types, so nothing in a save file should
+    # ever need to import code.
+    def find_class(self, module, name):
+        raise SaveError(f"unexpected {module}.{name} in save data")
+
+
+def encode(state, kind=FULL, snapshot_id=0, base_id=0):
+    payload = zlib.compress(pickle.dumps(state, protocol=4), 6)
+    return HEADER.pack(MAGIC, SAVE_VERSION, kind, snapshot_id, base_id, zlib.crc32(payload)) + payload
+
+
+def decode(data):
+    if len(data) < HEADER.size:
+        raise SaveError("save file is truncated")
+    magic, version, kind, snapshot_id, base_id, crc = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SaveError("not an Aeloria save file")
+    if version != SAVE_VERSION:
+        raise SaveError(f"unsupported save version {version}")
+    payload = memoryview(data)[HEADER.size:]
+    if zlib.crc32(payload) != crc:
+        raise SaveError("save file is corrupt")
+    try:
+        state = _PlainUnpickler(io.BytesIO(zlib.decompress(payload))).load()
+    except (zlib.error, pickle.UnpicklingError, EOFError) as e:
+        raise SaveError(f"save file is corrupt ({e})")
+    return kind, snapshot_id, base_id, state
+
+
+def read_save(path):
+    with open(path, "rb") as f:
+        return decode(f.read())
+
+
+def write_atomic(path, data):
+    # Write then rename, so a crash mid-write never leaves half a save.
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def diff_state(base, state):
+    delta = {name: state[name] for name in SECTIONS if state[name] != base[name]}
+
+    base_units = base["units"]
+    delta["units"] = {
+        i: row for i, row in enumerate(state["units"])
+        if i >= len(base_units) or row != base_units[i]
+    }
+
+    added = state["log_count"] - base["log_count"]
+    if added >= 0:
+        log = state["log"]
+        delta["log_tail"] = log[len(log) - min(added, len(log)):]
+    else:
+        delta["log"] = state["log"]
+    delta["log_count"] = state["log_count"]
+
+    base_actions = len(base["actions"])
+    if len(state["actions"]) >= base_actions:
+        delta["actions_tail"] = state["actions"][base_actions:]
+    else:
+        delta["actions"] = state["actions"]
+    return delta
+
+
+def apply_delta(base, delta):
+    state = dict(base)
+    for name in SECTIONS:
+        if name in delta:
+            state[name] = delta[name]
+
+    units = list(base["units"])
+    for i, row in sorted(delta["units"].items()):
+        if i < len(units):
+            units[i] = row
+        else:
+            units.append(row)
+    state["units"] = units
+
+    if "log" in delta:
+        state["log"] = delta["log"]
+    else:
+        capacity = state["static"]["log_capacity"]
+        state["log"] = (base["log"] + delta["log_tail"])[-capacity:]
+    state["log_count"] = delta["log_count"]
+
+    if "actions" in delta:
+        state["actions"] = delta["actions"]
+    else:
+        state["actions"] = base["actions"] + delta["actions_tail"]
+    return state
+
+
+class SaveWriter:
+    # Encodes and writes saves on a background thread, so the frame loop
+    # only pays for taking the snapshot. When several saves to the same
+    # file are queued only the newest is written.
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="save-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path, build):
+        # build() returns the bytes to write; it runs on the writer thread.
+        with self._lock:
+            generation = self._latest.get(path, 0) + 1
+            self._latest[path] = generation
+        self._queue.put((path, generation, build))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                path, generation, build = job
+                with self._lock:
+                    stale = self._latest[path] != generation
+                if not stale:
+                    write_atomic(path, build())
+                    self.written += 1
+            except Exception as e:
+                tracer.note("ui", "SAVE", f"Could not write {job[0]}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+def new_snapshot_id():
+    return secrets.randbits(32) or 1
+
+
+def save_game(session, path, writer=None):
+    # Full snapshot; written in the background when a writer is given.
+    state = session.snapshot()
+    snapshot_id = new_snapshot_id()
+    if writer is None:
+        write_atomic(path, encode(state, FULL, snapshot_id))
+    else:
+        writer.submit(path, lambda: encode(state, FULL, snapshot_id))
+    return path
+
+
+class Autosaver:
+    # Every full_every saves write a full snapshot; the ones in between
+    # write only what changed since it, to a small delta file beside it.
+    def __init__(self, writer, path=None, full_every=FULL_EVERY):
+        self.writer = writer
+        self.path = path or save_path_for(AUTOSAVE_NAME)
+        self.delta_path = delta_path_for(self.path)
+        self.full_every = full_every
+        self.base = None
+        self.base_id = 0
+        self.since_full = 0
+
+    def save(self, session):
+        state = session.snapshot()
+        if self.base is None or self.since_full >= self.full_every:
+            snapshot_id = new_snapshot_id()
+            self.base = state
+            self.base_id = snapshot_id
+            self.since_full = 0
+            self.writer.submit(self.path, lambda: encode(state, FULL, snapshot_id))
+            return FULL
+
+        self.since_full += 1
+        base, base_id = self.base, self.base_id
+        self.writer.submit(self.delta_path, lambda: encode(diff_state(base, state), DELTA, base_id=base_id))
+        return DELTA
+
+
+def load_state(path):
+    kind, snapshot_id, _, state = read_save(path)
+    if kind != FULL:
+        raise SaveError(f"{path} is not a full snapshot")
+
+    delta_path = delta_path_for(path)
+    if os.path.exists(delta_path):
+        try:
+            kind, _, base_id, delta = read_save(delta_path)
+        except (SaveError, OSError) as e:
+            tracer.note("ui", "LOAD", f"Ignoring {delta_path}: {e}")
+        else:
+            # A delta written against an older snapshot is just out of date.
+            if kind == DELTA and base_id == snapshot_id:
+                state = apply_delta(state, delta)
+    return state
+
+
+def load_game(path, log=None, planner=None, planner_teams=None):
+    return BattleSession.from_snapshot(load_state(path), log, planner, planner_teams)
+
+
+def save_path_for(name, directory=SAVES_DIR):
+    return os.path.join(directory, f"{name}.sav")
+
+
+def delta_path_for(path):
+    return os.path.splitext(path)[0] + ".delta"
+
+
+def _last_written(path):
+    delta_path = delta_path_for(path)
+    mtime = os.path.getmtime(path)
+    if os.path.exists(delta_path):
+        mtime = max(mtime, os.path.getmtime(delta_path))
+    return mtime
+
+
+def latest_save(directory=SAVES_DIR):
+    saves = glob.glob(os.path.join(directory, "*.sav"))
+    return max(saves, key=_last_written) if saves else None
@@ -0,0 +1,57 @@
+import time
+
+import pygame
+
+
+FPS = 60
+FRAME_BUDGET_MS = 8
+REDRAW_EVENTS = (pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWSHOWN)
+
+
+class FrameScheduler:
+    # Runs at full rate only while something asks for it (an animation, AI
+    # turns being played out); otherwise the loop sleeps in event.wait until
+    # there is input. Work that can be split up checks within_budget() so
+    # one frame never runs much past its slice.
+    def __init__(self, fps=FPS, budget_ms=FRAME_BUDGET_MS, idle_timeout_ms=0):
+        self.fps = fps
+        self.budget = budget_ms / 1000
+        self.idle_timeout_ms = idle_timeout_ms
+        self.clock = pygame.time.Clock()
+        self.frame_start = time.perf_counter()
+        self.frames = 0
+        self.idle_waits = 0
+        self._active = set()
+
+    def set_active(self, reason, active=True):
+        if active:
+            self._active.add(reason)
+        else:
+            self._active.discard(reason)
+
+    @property
+    def animating(self):
+        return bool(self._active)
+
+    def within_budget(self):
+        return time.perf_counter() - self.frame_start < self.budget
+
+    def events(self):
+        # Ends the current frame and returns the input for the next one.
+        if self._active:
+            self.clock.tick(self.fps)
+            events = pygame.event.get()
+        else:
+            self.idle_waits += 1
+            first = pygame.event.wait(self.idle_timeout_ms)
+            events = [first] if first.type != pygame.NOEVENT else []
+            events.extend(pygame.event.get())
+            self.clock.tick()  # Restart frame timing after the sleep.
+
+        self.frames += 1
+        self.frame_start = time.perf_counter()
+        return events
+
+
+def needs_redraw(event):
+    return event.type in REDRAW_EVENTS
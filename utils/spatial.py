@@ -0,0 +1,52 @@
+class OccupancyGrid:
+    # Maps (x, y) tiles to the unit standing on them.
+    def __init__(self, units=()):
+        self.cells = {}
+        for unit in units:
+            self.add(unit)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __iter__(self):
+        return iter(self.cells.values())
+
+    def __contains__(self, unit):
+        return self.cells.get((unit.x, unit.y)) is unit
+
+    def get(self, x, y):
+        return self.cells.get((x, y))
+
+    def add(self, unit):
+        self.cells[(unit.x, unit.y)] = unit
+
+    def remove(self, unit):
+        if self.cells.get((unit.x, unit.y)) is unit:
+            del self.cells[(unit.x, unit.y)]
+
+    def move(self, unit, x, y):
+        self.remove(unit)
+        unit.x = x
+        unit.y = y
+        self.add(unit)
+
+    def in_rect(self, x0, y0, x1, y1):
+        # Inclusive bounds; walks whichever is smaller, the rect or the occupants.
+        area = (x1 - x0 + 1) * (y1 - y0 + 1)
+        if area <= len(self.cells):
+            cells = self.cells
+            return [
+                cells[(x, y)]
+                for y in range(y0, y1 + 1)
+                for x in range(x0, x1 + 1)
+                if (x, y) in cells
+            ]
+        return [u for (x, y), u in self.cells.items() if x0 <= x <= x1 and y0 <= y <= y1]
+
+    def in_radius(self, cx, cy, radius):
+        reach = int(radius)
+        limit = radius * radius
+        return [
+            u for u in self.in_rect(cx - reach, cy - reach, cx + reach, cy + reach)
+            if (u.x - cx) ** 2 + (u.y - cy) ** 2 <= limit
+        ]
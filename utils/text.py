@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import os
+import pygame
+
+
+TEXT_CACHE_SIZE = 512
+
+_fonts = {}
+
+
+def get_font(face, size):
+    # face is a system font name, a font file path, or None for the default.
+    key = (face, size)
+    font = _fonts.get(key)
+    if font is None:
+        if face and os.path.isfile(face):
+            font = pygame.font.Font(face, size)
+        else:
+            font = pygame.font.SysFont(face, size)
+        _fonts[key] = font
+    return font
+
+
+class TextCache:
+    # Bounded LRU of rendered text surfaces keyed by (text, font, colour).
+    # Returned surfaces are shared, so callers must only blit them.
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def render(self, font, text, color, antialias=True):
+        key = (text, font, color, antialias)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.capacity:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._surfaces),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self._surfaces.clear()
+
+
+text_cache = TextCache()
+
+
+def render_text(font, text, color, antialias=True):
+    return text_cache.render(font, text, color, antialias)
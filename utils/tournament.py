@@ -0,0 +1,199 @@
+from collections import Counter
+from multiprocessing import Pool
+import argparse
+import json
+import os
+import sys
+
+from res.campaign import CAMPAIGNS_DIR
+from res.planner import PLANNERS, make_planner
+from utils.battle import DEFAULT_ENEMIES, BattleSession
+from utils.replay import Replay, replay_path_for
+from utils.rng import BattleRng
+from utils.trace import JsonlSink, tracer
+
+
+MAX_TURNS = 500
+
+
+class MatchupStats:
+    def __init__(self, party, enemies):
+        self.party = party
+        self.enemies = enemies
+        self.battles = 0
+        self.outcomes = Counter()
+        self.turns_to_victory = Counter()
+        self.damage_by_skill = Counter()
+
+    def record(self, session):
+        self.battles += 1
+        self.outcomes[session.outcome or "timeout"] += 1
+        if session.victory:
+            self.turns_to_victory[session.turns_taken] += 1
+        self.damage_by_skill.update(session.damage_by_skill)
+
+    def merge(self, other):
+        self.battles += other.battles
+        self.outcomes.update(other.outcomes)
+        self.turns_to_victory.update(other.turns_to_victory)
+        self.damage_by_skill.update(other.damage_by_skill)
+
+    @property
+    def win_rate(self):
+        return self.outcomes["victory"] / self.battles if self.battles else 0.0
+
+    def to_dict(self):
+        return {
+            "party": self.party,
+            "enemies": self.enemies,
+            "battles": self.battles,
+            "win_rate": self.win_rate,
+            "outcomes": dict(self.outcomes),
+            "turns_to_victory": {str(k): v for k, v in sorted(self.turns_to_victory.items())},
+            "damage_by_skill": dict(self.damage_by_skill.most_common()),
+        }
+
+
+def battle_seed(base_seed, matchup_index, battle_index):
+    # String seeds are hashed, so every battle gets its own stream no
+    # matter which worker picks up its chunk.
+    return f"{base_seed}:{matchup_index}:{battle_index}"
+
+
+def _init_worker(trace_spec="off", trace_path=None):
+    # Battles are silent unless asked; a trace file gets one JSONL per worker.
+    tracer.close()
+    if trace_path:
+        tracer.add_sink(JsonlSink(f"{trace_path}.{os.getpid()}.jsonl"))
+    tracer.configure(trace_spec)
+
+
+def run_chunk(task):
+    campaign_name, root, matchup_index, party, enemies, start, count, base_seed, ai, ai_rollouts, replay_dir = task
+    stats = MatchupStats(party, enemies)
+    for battle_index in range(start, start + count):
+        # Rollout counts rather than time budgets keep results independent of machine load.
+        planner = make_planner(ai, max_rollouts=ai_rollouts)
+        session = BattleSession.from_campaign(
+            campaign_name, party_names=party, enemy_names=enemies, root=root, ai_teams=("enemy", "player"),
+            planner=planner, planner_teams=("enemy",), rng=BattleRng(battle_seed(base_seed, matchup_index, battle_index))
+        )
+        session.run_until_done(max_turns=MAX_TURNS)
+        stats.record(session)
+        if replay_dir:
+            Replay.from_session(session).save(
+                replay_path_for(f"matchup{matchup_index}_battle{battle_index}", replay_dir)
+            )
+    tracer.flush()  # Pool workers are terminated, not shut down cleanly.
+    return matchup_index, stats
+
+
+def build_tasks(campaign_name, matchups, battles, chunk_size, base_seed, ai="greedy", ai_rollouts=200, replay_dir=None,
+                root=CAMPAIGNS_DIR):
+    tasks = []
+    for matchup_index, (party, enemies) in enumerate(matchups):
+        for start in range(0, battles, chunk_size):
+            count = min(chunk_size, battles - start)
+            tasks.append((campaign_name, root, matchup_index, party, enemies, start, count, base_seed, ai, ai_rollouts, replay_dir))
+    return tasks
+
+
+def run_tournament(campaign_name, matchups, battles, workers=None, chunk_size=None, base_seed=0, on_progress=None,
+                   trace_spec="off", trace_path=None, ai="greedy", ai_rollouts=200, replay_dir=None, root=CAMPAIGNS_DIR):
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        # Several chunks per worker keeps every core busy until the tail.
+        chunk_size = max(1, min(250, battles * len(matchups) // (workers * 8)))
+
+    results = [MatchupStats(party, enemies) for party, enemies in matchups]
+    tasks = build_tasks(campaign_name, matchups, battles, chunk_size, base_seed, ai, ai_rollouts, replay_dir, root)
+
+    with Pool(workers, initializer=_init_worker, initargs=(trace_spec, trace_path)) as pool:
+        for matchup_index, stats in pool.imap_unordered(run_chunk, tasks):
+            results[matchup_index].merge(stats)
+            if on_progress:
+                on_progress(matchup_index, results[matchup_index])
+
+    return results
+
+
+def load_matchups(args, campaign_name):
+    if args.spec:
+        with open(args.spec) as f:
+            spec = json.load(f)
+        return [(m.get("party"), m.get("enemies", DEFAULT_ENEMIES)) for m in spec]
+
+    parties = [p.split(",") for p in args.party] if args.party else [None]
+    enemy_groups = [e.split(",") for e in args.enemies] if args.enemies else [DEFAULT_ENEMIES]
+    return [(party, enemies) for party in parties for enemies in enemy_groups]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded AI-vs-AI battles across a process pool.")
+    parser.add_argument("campaign_dir", help="Path to a campaign, e.g. campaigns/Elarion")
+    parser.add_argument("--party", action="append", help="Comma-separated party member names (repeatable)")
+    parser.add_argument("--enemies", action="append", help="Comma-separated enemy names (repeatable)")
+    parser.add_argument("--spec", help="JSON list of {\"party\": [...], \"enemies\": [...]} matchups")
+    parser.add_argument("--battles", type=int, default=100, help="Battles per matchup")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print aggregate results as JSON")
+    parser.add_argument("--ai", choices=sorted(PLANNERS), default="greedy", help="Planner for the enemy side")
+    parser.add_argument("--ai-rollouts", type=int, default=200, help="Rollouts per enemy turn for the mcts planner")
+    parser.add_argument("--replay-dir", help="Save every battle as a replay in this directory")
+    parser.add_argument("--trace", default="off", help="Trace levels for battles, e.g. \"info\" or \"off,attack=info\"")
+    parser.add_argument("--trace-file", help="Write battle traces to <path>.<pid>.jsonl instead of the console")
+    args = parser.parse_args(argv)
+
+    campaign_dir = os.path.abspath(args.campaign_dir)
+    trace_path = os.path.abspath(args.trace_file) if args.trace_file else None
+    replay_dir = os.path.abspath(args.replay_dir) if args.replay_dir else None
+    if trace_path:
+        os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+    campaign_name = os.path.basename(campaign_dir)
+    # The campaign is loaded from wherever it lives, e.g. a checkout's
+    # campaigns/ folder or a directory of campaigns under test.
+    root = os.path.dirname(campaign_dir)
+    if root == os.path.abspath(CAMPAIGNS_DIR):
+        root = CAMPAIGNS_DIR  # Keeps replays of campaigns/ portable.
+
+    matchups = load_matchups(args, campaign_name)
+
+    def report(matchup_index, stats):
+        print(f"[TOURNAMENT] matchup {matchup_index}: {stats.battles}/{args.battles} battles, win rate {stats.win_rate:.1%}", file=sys.stderr)
+
+    results = run_tournament(
+        campaign_name,
+        matchups,
+        args.battles,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        base_seed=args.seed,
+        on_progress=report,
+        trace_spec=args.trace,
+        trace_path=trace_path,
+        ai=args.ai,
+        ai_rollouts=args.ai_rollouts,
+        replay_dir=replay_dir,
+        root=root
+    )
+
+    if args.json:
+        print(json.dumps([stats.to_dict() for stats in results], indent=2))
+        return
+
+    for stats in results:
+        party = ", ".join(stats.party) if stats.party else "starters"
+        print(f"\n{party} vs {', '.join(stats.enemies)}")
+        print(f"  battles: {stats.battles}  win rate: {stats.win_rate:.1%}  outcomes: {dict(stats.outcomes)}")
+        print("  turns to victory:")
+        for turns, count in sorted(stats.turns_to_victory.items()):
+            print(f"    {turns:>4} {'#' * max(1, count * 40 // stats.battles)} {count}")
+        print("  damage by skill:")
+        for skill, damage in stats.damage_by_skill.most_common():
+            print(f"    {skill}: {damage}")
+
+
+if __name__ == "__main__":
+    main()
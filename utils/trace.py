@@ -0,0 +1,246 @@
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import ClassVar
+import json
+import os
+import sys
+import threading
+
+
+OFF = 0
+INFO = 1
+DEBUG = 2
+LEVEL_NAMES = {"off": OFF, "info": INFO, "debug": DEBUG}
+CATEGORIES = ("roll", "move", "attack", "ko", "turn", "ai", "ui")
+TRACE_ENV = "AELORIA_TRACE"
+
+
+@dataclass
+class TraceEvent:
+    category: ClassVar[str] = "ui"
+
+    def message(self):
+        return str(self)
+
+    def to_dict(self):
+        return {"event": type(self).__name__, "category": self.category, **asdict(self)}
+
+
+@dataclass
+class RollEvent(TraceEvent):
+    category: ClassVar[str] = "roll"
+    actor: str
+    reason: str
+    breakdown: str
+    total: int
+    modifier: int = 0
+
+    def message(self):
+        if self.modifier:
+            return f"[{self.reason.upper()}] {self.actor} rolls {self.breakdown} + {self.modifier} = {self.total}"
+        return f"[{self.reason.upper()}] {self.actor} rolls {self.breakdown} = {self.total}"
+
+
+@dataclass
+class MoveEvent(TraceEvent):
+    category: ClassVar[str] = "move"
+    unit: str
+    origin: tuple
+    destination: tuple
+
+    def message(self):
+        return f"[MOVE] {self.unit} moved from {self.origin} to {self.destination}"
+
+
+@dataclass
+class AttackEvent(TraceEvent):
+    category: ClassVar[str] = "attack"
+    attacker: str
+    target: str
+    skill: str
+    damage: int
+    lines: list = field(default_factory=list)
+
+    def message(self):
+        return "\n".join(f"[ATTACK] {line}" for line in self.lines)
+
+
+@dataclass
+class KOEvent(TraceEvent):
+    category: ClassVar[str] = "ko"
+    unit: str
+
+    def message(self):
+        return f"[DEFEATED] {self.unit} is defeated"
+
+
+@dataclass
+class TurnEvent(TraceEvent):
+    category: ClassVar[str] = "turn"
+    unit: str
+    skipped: bool = False
+
+    def message(self):
+        if self.skipped:
+            return f"[SKIP] {self.unit} is KO'd — skipping turn"
+        return f"[TURN] It's now {self.unit}'s turn"
+
+
+@dataclass
+class Note(TraceEvent):
+    # Free-form line for categories without a structured event.
+    note_category: str
+    tag: str
+    text: str
+
+    @property
+    def category(self):
+        return self.note_category
+
+    def message(self):
+        return f"[{self.tag}] {self.text}"
+
+
+class ConsoleSink:
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, event):
+        print(event.message(), file=self.stream or sys.stdout)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    # Buffers encoded events and writes them in batches.
+    def __init__(self, path, buffer_size=256):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, event):
+        self._buffer.append(json.dumps(event.to_dict(), default=str))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class RingSink:
+    def __init__(self, capacity=1000):
+        self.events = deque(maxlen=capacity)
+
+    def write(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Tracer:
+    # Callers guard event construction with enabled(), so a disabled
+    # category costs one dict lookup:
+    #     if tracer.enabled("roll"):
+    #         tracer.emit(RollEvent(...))
+    def __init__(self, sinks=(), level=INFO):
+        self.sinks = list(sinks)
+        self.default_level = level
+        self.levels = {}
+        self._muted = set()  # Thread idents inside muted(); usually empty.
+        self._refresh()
+
+    def _refresh(self):
+        if self.sinks:
+            self._default = self.default_level
+            self._thresholds = {c: self.levels.get(c, self.default_level) for c in CATEGORIES}
+            self._thresholds.update(self.levels)
+        else:
+            self._default = OFF
+            self._thresholds = {}
+
+    def enabled(self, category, level=INFO):
+        if self._muted and threading.get_ident() in self._muted:
+            return False
+        return self._thresholds.get(category, self._default) >= level
+
+    def emit(self, event, level=INFO):
+        if self._thresholds.get(event.category, self._default) < level:
+            return
+        if self._muted and threading.get_ident() in self._muted:
+            return
+        for sink in self.sinks:
+            sink.write(event)
+
+    def note(self, category, tag, text, level=INFO):
+        if self.enabled(category, level):
+            self.emit(Note(category, tag, text), level)
+
+    def set_level(self, category, level):
+        if category is None:
+            self.default_level = level
+        else:
+            self.levels[category] = level
+        self._refresh()
+
+    def configure(self, spec):
+        # "info", "off" or per-category overrides like "info,roll=off,ai=debug".
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            category, _, name = part.rpartition("=")
+            self.set_level(category or None, LEVEL_NAMES[name.lower()])
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        self._refresh()
+        return sink
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+        self._refresh()
+
+    @contextmanager
+    def muted(self):
+        # Silences the calling thread only, e.g. a background copy of the
+        # battle replaying turns that were already traced.
+        ident = threading.get_ident()
+        self._muted.add(ident)
+        try:
+            yield
+        finally:
+            self._muted.discard(ident)
+
+    def disable(self):
+        self.set_level(None, OFF)
+        self.levels.clear()
+        self._refresh()
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks.clear()
+        self._refresh()
+
+
+tracer = Tracer([ConsoleSink()])
+if os.environ.get(TRACE_ENV):
+    tracer.configure(os.environ[TRACE_ENV])
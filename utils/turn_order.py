@@ -0,0 +1,120 @@
+import heapq
+
+
+CHARGE_TIME = 100  # Charge a unit needs before it can act.
+BASE_SPEED = 10
+
+
+def unit_speed(unit):
+    # Units without an explicit speed charge faster with better initiative.
+    speed = getattr(unit, "speed", None)
+    if speed is None:
+        speed = BASE_SPEED + unit.initiative
+    return max(1, speed)
+
+
+class Timeline:
+    # Charge-time turn order. Every unit charges at its speed and acts once
+    # it reaches CHARGE_TIME, so fast units get more turns than slow ones.
+    # Entries are [ready_time, -priority, seq, unit, live]; removing a unit
+    # just marks its entry dead and the heap drops it when it surfaces.
+    def __init__(self, units=(), roll=None):
+        self.now = 0.0
+        self._heap = []
+        self._entries = {}
+        self._seq = 0
+        self._dead = 0
+        for unit in units:
+            self.add(unit, roll(unit) if roll else 0)
+
+    def _push(self, unit, ready_time, priority):
+        entry = [ready_time, -priority, self._seq, unit, True]
+        self._seq += 1
+        self._entries[id(unit)] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _kill(self, entry):
+        entry[4] = False
+        self._dead += 1
+        if self._dead > 32 and self._dead > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if e[4]]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def add(self, unit, charge=0):
+        # New units (including summons) start with some charge already
+        # banked; charge also breaks ties, highest first.
+        if id(unit) in self._entries:
+            return
+        remaining = max(0, CHARGE_TIME - charge)
+        self._push(unit, self.now + remaining / unit_speed(unit), charge)
+
+    def remove(self, unit):
+        entry = self._entries.pop(id(unit), None)
+        if entry is None:
+            return False
+        self._kill(entry)
+        return True
+
+    def delay(self, unit, charge):
+        # Pushes a unit's next turn back by the given amount of charge.
+        entry = self._entries.get(id(unit))
+        if entry is None:
+            return False
+        self._kill(entry)
+        self._push(unit, entry[0] + charge / unit_speed(unit), -entry[1])
+        return True
+
+    def next(self):
+        # Pops the next unit to act and schedules its following turn.
+        heap = self._heap
+        while heap:
+            entry = heapq.heappop(heap)
+            if not entry[4]:
+                self._dead -= 1
+                continue
+            ready_time, priority, _, unit, _ = entry
+            self.now = ready_time
+            self._push(unit, ready_time + CHARGE_TIME / unit_speed(unit), -priority)
+            return unit
+        return None
+
+    def upcoming(self, count):
+        # The next count turns, without advancing the timeline.
+        heap = [list(e) for e in self._heap if e[4]]
+        heapq.heapify(heap)
+        turns = []
+        while heap and len(turns) < count:
+            entry = heapq.heappop(heap)
+            turns.append(entry[3])
+            entry[0] += CHARGE_TIME / unit_speed(entry[3])
+            heapq.heappush(heap, entry)
+        return turns
+
+    def state(self, ref):
+        # Live entries as plain data, with units swapped for ref(unit).
+        entries = [(e[0], e[1], e[2], ref(e[3])) for e in self._entries.values()]
+        return (self.now, self._seq, entries)
+
+    @classmethod
+    def restore(cls, state, unit_of):
+        now, seq, entries = state
+        timeline = cls()
+        timeline.now = now
+        timeline._seq = seq
+        for ready_time, priority, entry_seq, ref in entries:
+            unit = unit_of(ref)
+            entry = [ready_time, priority, entry_seq, unit, True]
+            timeline._entries[id(unit)] = entry
+            timeline._heap.append(entry)
+        heapq.heapify(timeline._heap)
+        return timeline
+
+    def __contains__(self, unit):
+        return id(unit) in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return (entry[3] for entry in self._entries.values())